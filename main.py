@@ -1,14 +1,48 @@
 import os
+import json
+import time
 import argparse
+from datetime import date
 from src.graph import build_graph
+from src.config import routing_metrics
+from src.sharding import run_sharded
+from src.feed import is_url, feed_path
+from src.agents.content import LOCALES
+
+def positive_int(value: str) -> int:
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {n}")
+    return n
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Shopify Dropshipping Ops Agent")
-    parser.add_argument("--catalog", required=True, help="Path to supplier CSV")
+    parser.add_argument("--catalog", required=True, help="Path or http(s) URL of the supplier CSV feed")
     parser.add_argument("--orders", required=True, help="Path to orders CSV")
     parser.add_argument("--out", required=True, help="Output directory")
+    parser.add_argument("--dedupe", action="store_true", help="Generate one listing per cluster of near-duplicate products")
+    parser.add_argument("--pack-size", type=positive_int, default=1, help="Max products per listing prompt (shrunk to fit the model's context)")
+    parser.add_argument("--locales", default="", help="Comma-separated markets to write listings for in one call each (e.g. US,AU,UK)")
+    parser.add_argument("--pipeline", action="store_true", help="Hand each listing straight to QA instead of running the stages back to back")
+    parser.add_argument("--pipeline-depth", type=positive_int, default=4, help="Max listings queued for QA in pipeline mode")
+    parser.add_argument("--qa-regenerate", action="store_true", help="In pipeline mode, regenerate listings that fail QA once")
+    parser.add_argument("--storefront-url", default=os.getenv("STOREFRONT_URL", ""), help="Storefront bulk update endpoint (e.g. a local src.mock_storefront)")
+    parser.add_argument("--sync-batch-size", type=positive_int, default=100, help="Items per bulk storefront mutation")
+    parser.add_argument("--sync-workers", type=positive_int, default=4, help="Max concurrent storefront requests")
+    parser.add_argument("--profile", action="store_true", help="Write per-node cProfile/tracemalloc results to <out>/profile")
+    parser.add_argument("--shards", type=positive_int, default=1, help="Split the catalog and orders by SKU hash across this many worker processes")
+    parser.add_argument("--deadline-minutes", type=float, default=0, help="Hard run window; LLM steps degrade to finish in time (0 = no deadline)")
+    parser.add_argument("--history-db", default="", help="SQLite run-history store (default: <out>/history.sqlite)")
+    parser.add_argument("--orders-db", default="", help="SQLite store of processed orders (default: <out>/orders.sqlite)")
+    parser.add_argument("--reprocess-orders", action="store_true", help="Route every order in the file, ignoring the processed-orders store")
+    parser.add_argument("--run-date", type=date.fromisoformat, default=date.today(), help="Date to file this run's facts under (YYYY-MM-DD)")
+    parser.add_argument("--no-llm-summary", action="store_true", help="Build reports from the rule-based summary only")
     
     args = parser.parse_args()
+    locales = [l.strip().upper() for l in args.locales.split(",") if l.strip()]
+    unknown = [l for l in locales if l not in LOCALES]
+    if unknown:
+        parser.error(f"unknown locale(s) {', '.join(unknown)}; choose from {', '.join(LOCALES)}")
     
     # Ensure output dir exists
     os.makedirs(args.out, exist_ok=True)
@@ -16,22 +50,56 @@ if __name__ == "__main__":
     print(f"Starting Ops Agent...\nInputs: {args.catalog}, {args.orders}\nOutput: {args.out}")
     
     # Initialize State
+    started = time.time()
     initial_state = {
-        "catalog_path": args.catalog,
+        "catalog_url": args.catalog if is_url(args.catalog) else "",
+        "catalog_path": feed_path(args.catalog, os.path.join(args.out, "feed")) if is_url(args.catalog) else args.catalog,
         "orders_path": args.orders,
         "output_dir": args.out,
-        "raw_catalog": [],
+        "llm_summary": not args.no_llm_summary,
+        "profile": args.profile,
+        "run_started": started,
+        "run_id": time.strftime("%Y%m%dT%H%M%S", time.localtime(started)) + f"-{os.getpid()}",
+        "run_date": args.run_date.isoformat(),
+        "history_db": args.history_db or os.path.join(args.out, "history.sqlite"),
+        "orders_db": "" if args.reprocess_orders else args.orders_db or os.path.join(args.out, "orders.sqlite"),
+        "deadline": started + args.deadline_minutes * 60 if args.deadline_minutes else 0,
+        "dedupe_listings": args.dedupe,
+        "pack_size": args.pack_size,
+        "locales": locales,
+        "pipeline_listing_qa": args.pipeline,
+        "pipeline_depth": args.pipeline_depth,
+        "qa_regenerate": args.qa_regenerate,
+        "storefront_url": args.storefront_url,
+        "sync_batch_size": args.sync_batch_size,
+        "sync_workers": args.sync_workers,
+        "catalog_stock": {},
         "selected_skus": [],
         "listings": [],
         "listing_redlines": [],
         "price_updates": [],
         "stock_updates": [],
+        "feed_result": {},
+        "sync_result": {},
         "order_actions": [],
-        "daily_report": ""
+        "daily_report": "",
+        "report_stats": {},
+        "report_summary": {},
+        "manager_report": "",
+        "degradations": [],
+        "node_timings": [],
+        "llm_output": []
     }
     
     # Build and Run
-    app = build_graph()
-    app.invoke(initial_state)
+    if args.shards > 1:
+        run_sharded(initial_state, args.shards)
+    else:
+        app = build_graph()
+        app.invoke(initial_state)
+
+    # Record which backends served each role
+    with open(os.path.join(args.out, "llm_routing.json"), "w") as f:
+        json.dump(routing_metrics(), f, indent=2)
     
     print("\nWorkflow Complete. Check 'out/' directory.")
\ No newline at end of file
@@ -1,76 +1,480 @@
 import os
+import re
 import json
+import queue
+import threading
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
-from src.config import get_llm
+from pydantic import ValidationError
+from src.config import get_llm, model_limits
 from src.state import AgentState
+from src.schemas import Listing, QAVerdict
+from src.structured import json_parser, new_usage
+from src.dedupe import cluster_products, adapt_listing
+from src.deadline import node_deadline, expired, degradation, DeadlineExceeded
 
-def listing_agent(state: AgentState):
-    print("--- [3/7] Listing Agent (LLM) ---")
-    llm = get_llm("listing")
-    generated_listings = []
-    
-    prompt_template = ChatPromptTemplate.from_template(
-        """You are a professional Shopify Copywriter.
-        Create a listing for the following product. 
-        Output strictly JSON with keys: title, description_html, bullets (list), tags (list), seo_title, seo_description.
-        
-        Product Data:
-        Name: {name}
-        Category: {category}
-        Description: {description}
-        Features: Weight {weight_kg}kg
-        """
-    )
-    
-    chain = prompt_template | llm | JsonOutputParser()
-    
-    for item in state['selected_skus']:
-        try:
-            res = chain.invoke({
+LISTING_PROMPT = ChatPromptTemplate.from_template(
+    """You are a professional Shopify Copywriter.
+    Create a listing for the following product.
+    Output strictly JSON with keys: title, description_html, bullets (list), tags (list), seo_title, seo_description.
+
+    Product Data:
+    Name: {name}
+    Category: {category}
+    Description: {description}
+    Features: Weight {weight_kg}kg
+    {feedback}
+    """
+)
+
+BATCH_LISTING_PROMPT = ChatPromptTemplate.from_template(
+    """You are a professional Shopify Copywriter.
+    Create a listing for each of the following products.
+    Output strictly a JSON array with one object per product, each with keys: sku (copied from the product), title, description_html, bullets (list), tags (list), seo_title, seo_description.
+
+    Products (one JSON object per line):
+    {products}
+    """
+)
+
+# Storefront markets (customer_country) and how their listings differ
+LOCALES = {
+    "US": {"code": "en-US", "style": "American English spelling, imperial units (lb, in) with metric in brackets"},
+    "AU": {"code": "en-AU", "style": "Australian English spelling, metric units"},
+    "UK": {"code": "en-GB", "style": "British English spelling, metric units"},
+}
+
+LOCALIZED_LISTING_PROMPT = ChatPromptTemplate.from_template(
+    """You are a professional Shopify Copywriter.
+    Create a listing for the following product for each of these markets:
+    {locale_specs}
+    Follow each market's spelling and measurement units, and pick SEO title, description and tags for that market's shoppers.
+    Output strictly one JSON object keyed by locale code ({locale_codes}). Each value has keys: title, description_html, bullets (list), tags (list), seo_title, seo_description.
+
+    Product Data:
+    Name: {name}
+    Category: {category}
+    Description: {description}
+    Features: Weight {weight_kg}kg
+    {feedback}
+    """
+)
+
+QA_PROMPT = ChatPromptTemplate.from_template(
+    """Review this Shopify listing for compliance.
+    Check for: Grammar errors, Over-promising (claims not in data), and SEO length.
+    Output JSON: {{ "status": "PASS" or "FAIL", "issues": ["issue1", "issue2"] }}
+
+    Listing: {listing}
+    """
+)
+
+LOCALIZED_QA_PROMPT = ChatPromptTemplate.from_template(
+    """Review these market variants of one Shopify listing for compliance.
+    Check each for: Grammar and spelling for its locale, Over-promising (claims not in data), SEO length, and units matching the locale.
+    Output JSON keyed by locale code: {{ "<locale>": {{ "status": "PASS" or "FAIL", "issues": ["issue1"] }} }}
+
+    Variants: {variants}
+    """
+)
+
+def listing_chains(llm, usage=None):
+    """Single-product requests return a validated Listing; packed and localized ones JSON to check per entry."""
+    usage = usage if usage is not None else new_usage()
+    return {
+        "single": LISTING_PROMPT | llm.with_structured_output(Listing, usage=usage),
+        "batch": BATCH_LISTING_PROMPT | llm | json_parser(usage),
+        "localized": LOCALIZED_LISTING_PROMPT | llm | json_parser(usage),
+        "usage": usage,
+    }
+
+def qa_chains(llm, usage=None):
+    usage = usage if usage is not None else new_usage()
+    return {
+        "single": QA_PROMPT | llm.with_structured_output(QAVerdict, usage=usage),
+        "localized": LOCALIZED_QA_PROMPT | llm | json_parser(usage),
+        "usage": usage,
+    }
+
+def llm_output(node, *chains, dropped=()):
+    """Per-node LLM output counters for the report."""
+    totals = new_usage()
+    for c in chains:
+        for k in totals:
+            totals[k] += c['usage'][k]
+    return [{"node": node, **totals, "dropped_skus": sorted(dropped)}]
+
+def _feedback(issues):
+    if not issues:
+        return ""
+    return "A reviewer rejected the previous version. Fix these issues: " + "; ".join(issues)
+
+def generate_listing(chain, item, issues=None):
+    res = chain.invoke({
+        "name": item['name'],
+        "category": item['category'],
+        "description": item['description'],
+        "weight_kg": item['weight_kg'],
+        "feedback": _feedback(issues)
+    })
+    res['sku'] = item['supplier_sku']
+    return res
+
+# Rough token estimates for sizing packed prompts
+CHARS_PER_TOKEN = 4
+PROMPT_OVERHEAD_TOKENS = 200
+OUTPUT_TOKENS_PER_LISTING = 450
+
+def malformed_fields(res):
+    """Listing fields that are missing or of the wrong type."""
+    try:
+        Listing.model_validate(res)
+        return []
+    except ValidationError as e:
+        return sorted({str(err['loc'][0]) if err['loc'] else "listing" for err in e.errors()})
+
+def valid_listing(res) -> bool:
+    return not malformed_fields(res)
+
+def _product_line(item) -> str:
+    return json.dumps({
+        "sku": item['supplier_sku'],
+        "name": item['name'],
+        "category": item['category'],
+        "description": item['description'],
+        "weight_kg": item['weight_kg'],
+    })
+
+def plan_packs(items, max_k: int, limits):
+    """Split items into packs of at most max_k that fit the model's context and output limits."""
+    packs, pack, used = [], [], PROMPT_OVERHEAD_TOKENS
+    max_out = limits['max_output_tokens'] // OUTPUT_TOKENS_PER_LISTING
+    for item in items:
+        cost = len(_product_line(item)) // CHARS_PER_TOKEN + OUTPUT_TOKENS_PER_LISTING
+        if pack and (len(pack) >= min(max_k, max_out) or used + cost > limits['context_tokens']):
+            packs.append(pack)
+            pack, used = [], PROMPT_OVERHEAD_TOKENS
+        pack.append(item)
+        used += cost
+    if pack:
+        packs.append(pack)
+    return packs
+
+def generate_localized_listing(chains, item, locales, issues=None):
+    """
+    All locale variants of one product from a single request. The listing's
+    top-level fields are the first locale's variant; every variant is kept
+    under `locales`. Variants missing from the response are requested
+    individually.
+    """
+    codes = [LOCALES[l]['code'] for l in locales]
+    res = chains['localized'].invoke({
+        "locale_specs": "\n".join(f"- {LOCALES[l]['code']}: {LOCALES[l]['style']}" for l in locales),
+        "locale_codes": ", ".join(codes),
+        "name": item['name'],
+        "category": item['category'],
+        "description": item['description'],
+        "weight_kg": item['weight_kg'],
+        "feedback": _feedback(issues)
+    })
+    variants = {}
+    for locale, code in zip(locales, codes):
+        variant = res.get(code) if isinstance(res, dict) else None
+        if not valid_listing(variant):
+            print(f"Missing {code} variant for {item['supplier_sku']}, requesting it separately")
+            variant = chains['single'].invoke({
                 "name": item['name'],
                 "category": item['category'],
                 "description": item['description'],
-                "weight_kg": item['weight_kg']
+                "weight_kg": item['weight_kg'],
+                "feedback": f"Write for the {code} market: {LOCALES[locale]['style']}. " + _feedback(issues)
             })
-            res['sku'] = item['supplier_sku']
-            generated_listings.append(res)
-            print(f"Generated listing for {item['supplier_sku']}")
+        variants[code] = Listing.model_validate(variant).model_dump()
+    listing = dict(variants[codes[0]])
+    listing['sku'] = item['supplier_sku']
+    listing['locales'] = variants
+    return listing
+
+def generate_for(chains, item, state, issues=None):
+    """One listing (all locales when localization is on) for a product."""
+    if state.get('locales'):
+        return generate_localized_listing(chains, item, state['locales'], issues)
+    return generate_listing(chains['single'], item, issues)
+
+def generate_listing_pack(chains, items, state):
+    """
+    Generate listings for several products in one request. Entries that are
+    missing or malformed are retried as single-product requests.
+    Returns {sku: listing}; SKUs that still fail are left out.
+    """
+    results = {}
+    if len(items) > 1:
+        try:
+            res = chains['batch'].invoke({"products": "\n".join(_product_line(i) for i in items)})
+            wanted = {i['supplier_sku'] for i in items}
+            for entry in res if isinstance(res, list) else []:
+                if valid_listing(entry) and entry.get('sku') in wanted:
+                    results[entry['sku']] = {**Listing.model_validate(entry).model_dump(), "sku": entry['sku']}
+            if not results:
+                # Parsed, but nothing in it could be used
+                chains['usage']['wasted'] += 1
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            print(f"Packed listing request for {len(items)} SKUs failed: {e}")
+
+    for item in items:
+        if item['supplier_sku'] in results:
+            continue
+        if len(items) > 1:
+            print(f"Falling back to single request for {item['supplier_sku']}")
+        try:
+            results[item['supplier_sku']] = generate_for(chains, item, state)
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Failed to generate listing for {item['supplier_sku']}: {e}")
+    return results
+
+# Rule-only QA used when the LLM reviewer is out of time
+SEO_TITLE_MAX = 70
+SEO_DESCRIPTION_MAX = 160
+BANNED_CLAIMS = ("guarantee", "guaranteed", "best", "#1", "cure", "miracle", "risk-free", "lifetime")
+
+def rule_based_review(listing):
+    issues = []
+    malformed = malformed_fields(listing)
+    if malformed:
+        issues.append(f"Missing or malformed fields: {', '.join(malformed)}")
+    if len(str(listing.get('seo_title', ''))) > SEO_TITLE_MAX:
+        issues.append(f"SEO length: seo_title is over {SEO_TITLE_MAX} characters")
+    if len(str(listing.get('seo_description', ''))) > SEO_DESCRIPTION_MAX:
+        issues.append(f"SEO length: seo_description is over {SEO_DESCRIPTION_MAX} characters")
+    text = " ".join(str(listing.get(k, "")) for k in Listing.model_fields).lower()
+    for claim in BANNED_CLAIMS:
+        if re.search(r"(?<!\w)" + re.escape(claim) + r"(?!\w)", text):
+            issues.append(f"Over-promising: uses the claim '{claim}'")
+    return {"status": "FAIL" if issues else "PASS", "issues": issues, "sku": listing['sku'], "reviewer": "rules"}
+
+def _deferred_path(state: AgentState):
+    return os.path.join(state['output_dir'], "deferred_listings.json")
 
+def _load_deferred(state: AgentState):
+    if not os.path.exists(_deferred_path(state)):
+        return []
+    with open(_deferred_path(state)) as f:
+        return json.load(f)
+
+def _write_deferred(state: AgentState, skus):
+    with open(_deferred_path(state), "w") as f:
+        json.dump(skus, f, indent=2)
+
+def iter_listings(state: AgentState, chains, deadline=None, deferred=None, dropped=None, adapted=None):
+    """
+    Yield a listing per selected SKU as soon as it is available. SKUs deferred
+    by an earlier run go first; once `deadline` passes no new requests are
+    started and the remaining SKUs are appended to `deferred`. SKUs whose
+    generation failed are appended to `dropped`. Listings adapted from a
+    cluster head are recorded in `adapted` as {sku: head sku}.
+    """
+    selected = state['selected_skus']
+    carried = set(_load_deferred(state))
+    if carried:
+        selected = sorted(selected, key=lambda s: s['supplier_sku'] not in carried)
+    if state.get('dedupe_listings'):
+        # Generate one canonical listing per near-duplicate cluster and
+        # adapt it locally for the other SKUs in the cluster.
+        clusters = cluster_products(selected)
+        print(f"Grouped {len(selected)} SKUs into {len(clusters)} clusters")
+    else:
+        clusters = [[i] for i in range(len(selected))]
+
+    heads = [selected[c[0]] for c in clusters]
+    # Localized prompts already carry several variants, so they are not packed
+    pack_size = 1 if state.get('locales') else state.get('pack_size', 1)
+    if pack_size > 1:
+        packs = plan_packs(heads, pack_size, model_limits("listing"))
+        print(f"Packing {len(heads)} listings into {len(packs)} requests")
+    else:
+        packs = [[h] for h in heads]
+
+    position = 0
+    for pack in packs:
+        try:
+            if expired(deadline):
+                raise DeadlineExceeded("Listing deadline reached")
+            generated = generate_listing_pack(chains, pack, state)
+        except DeadlineExceeded:
+            if deferred is not None:
+                remaining = clusters[position:]
+                deferred.extend(selected[i]['supplier_sku'] for c in remaining for i in c)
+            return
+        for head in pack:
+            cluster = clusters[position]
+            position += 1
+            res = generated.get(head['supplier_sku'])
+            if res is None:
+                if dropped is not None:
+                    dropped.extend(selected[i]['supplier_sku'] for i in cluster)
+                continue
+            print(f"Generated listing for {head['supplier_sku']}")
+            yield res
+
+            for i in cluster[1:]:
+                print(f"Reused listing of {head['supplier_sku']} for {selected[i]['supplier_sku']}")
+                if adapted is not None:
+                    adapted[selected[i]['supplier_sku']] = head['supplier_sku']
+                yield adapt_listing(res, head, selected[i])
+
+def review_listing(chains, listing):
+    if 'locales' not in listing:
+        res = chains['single'].invoke({"listing": json.dumps(listing)})
+        res['sku'] = listing['sku']
+        return res
+
+    # All locale variants of a product are reviewed in one request
+    res = chains['localized'].invoke({"variants": json.dumps(listing['locales'])})
+    verdicts = {}
+    for code in listing['locales']:
+        try:
+            verdicts[code] = QAVerdict.model_validate(res.get(code) if isinstance(res, dict) else None).model_dump()
+        except ValidationError:
+            verdicts[code] = {"status": "FAIL", "issues": ["No review returned"]}
+    issues = [f"[{code}] {issue}" for code, v in verdicts.items() if v.get('status') == "FAIL" for issue in v.get('issues', [])]
+    failed = any(v.get('status') == "FAIL" for v in verdicts.values())
+    return {"status": "FAIL" if failed else "PASS", "issues": issues, "sku": listing['sku'], "locales": verdicts}
+
+def _write_listings(state: AgentState, listings):
     with open(os.path.join(state['output_dir'], "listings.json"), "w") as f:
-        json.dump(generated_listings, f, indent=2)
-        
-    return {"listings": generated_listings}
+        json.dump(listings, f, indent=2)
+
+    # One artifact per locale when localization is on
+    for locale in state.get('locales') or []:
+        code = LOCALES[locale]['code']
+        variants = [{**l['locales'][code], "sku": l['sku']} for l in listings if code in l.get('locales', {})]
+        with open(os.path.join(state['output_dir'], f"listings_{code}.json"), "w") as f:
+            json.dump(variants, f, indent=2)
+
+def _write_redlines(state: AgentState, redlines):
+    with open(os.path.join(state['output_dir'], "listing_redlines.json"), "w") as f:
+        json.dump(redlines, f, indent=2)
+
+def listing_agent(state: AgentState):
+    print("--- [3/7] Listing Agent (LLM) ---")
+    deadline = node_deadline(state, "listing")
+    chains = listing_chains(get_llm("listing", deadline))
+    deferred, dropped = [], []
+    generated_listings = list(iter_listings(state, chains, deadline, deferred, dropped))
+    _write_listings(state, generated_listings)
+    _write_deferred(state, deferred)
+
+    degraded = [degradation("listing", "deferred to next run", len(deferred), ", ".join(deferred))] if deferred else []
+    return {"listings": generated_listings, "degradations": degraded,
+            "llm_output": llm_output("listing", chains, dropped=dropped)}
 
 def qa_agent(state: AgentState):
     print("--- [4/7] QA Agent (LLM) ---")
-    llm = get_llm("qa")
-    listings = state['listings']
-    redlines = []
-    
-    prompt = ChatPromptTemplate.from_template(
-        """Review this Shopify listing for compliance. 
-        Check for: Grammar errors, Over-promising (claims not in data), and SEO length.
-        Output JSON: {{ "status": "PASS" or "FAIL", "issues": ["issue1", "issue2"] }}
-        
-        Listing: {listing}
-        """
-    )
-    
-    chain = prompt | llm | JsonOutputParser()
-    
-    for listing in listings:
+    deadline = node_deadline(state, "qa")
+    chains = qa_chains(get_llm("qa", deadline))
+    redlines, dropped = [], []
+    rule_only = 0
+
+    for listing in state['listings']:
         try:
-            res = chain.invoke({"listing": json.dumps(listing)})
-            res['sku'] = listing['sku']
-            if res['status'] == "FAIL":
-                redlines.append(res)
-        except:
-            pass 
-            
-    with open(os.path.join(state['output_dir'], "listing_redlines.json"), "w") as f:
-        json.dump(redlines, f, indent=2)
+            if expired(deadline):
+                raise DeadlineExceeded("QA deadline reached")
+            res = review_listing(chains, listing)
+        except DeadlineExceeded:
+            res = rule_based_review(listing)
+            rule_only += 1
+        except Exception as e:
+            # No usable verdict: fall back to the rule checks for this SKU
+            print(f"QA failed for {listing['sku']}, using rule-based review: {str(e).splitlines()[0]}")
+            dropped.append(listing['sku'])
+            res = rule_based_review(listing)
+        if res['status'] == "FAIL":
+            redlines.append(res)
+
+    _write_redlines(state, redlines)
+    degraded = [degradation("qa", "rule-only QA", rule_only)] if rule_only else []
+    return {"listing_redlines": redlines, "degradations": degraded,
+            "llm_output": llm_output("qa", chains, dropped=dropped)}
+
+def listing_qa_pipeline_agent(state: AgentState):
+    """
+    Listing and QA run concurrently: each listing goes straight to QA through
+    a bounded queue, so the producer blocks when QA falls behind. Listings that
+    fail QA can get one regeneration attempt with the reviewer's issues.
+    """
+    print("--- [3-4/7] Listing -> QA Pipeline (LLM) ---")
+    deadline = node_deadline(state, "listing_qa")
+    chains = listing_chains(get_llm("listing", deadline))
+    review_chains = qa_chains(get_llm("qa", deadline))
+    items = {item['supplier_sku']: item for item in state['selected_skus']}
+    handoff = queue.Queue(maxsize=state.get('pipeline_depth', 4))
+    done = object()
+    errors = []
+    deferred, dropped, unreviewed = [], [], []
+    adapted, regenerated = {}, {}
+
+    def produce():
+        try:
+            for listing in iter_listings(state, chains, deadline, deferred, dropped, adapted):
+                handoff.put(listing)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            handoff.put(done)
+
+    producer = threading.Thread(target=produce, name="listing-producer", daemon=True)
+    producer.start()
+
+    listings, redlines = [], []
+    rule_only = 0
+    while (listing := handoff.get()) is not done:
+        try:
+            if expired(deadline):
+                raise DeadlineExceeded("Pipeline deadline reached")
+            res = review_listing(review_chains, listing)
+        except DeadlineExceeded:
+            res = rule_based_review(listing)
+            rule_only += 1
+        except Exception as e:
+            print(f"QA failed for {listing['sku']}, using rule-based review: {str(e).splitlines()[0]}")
+            unreviewed.append(listing['sku'])
+            res = rule_based_review(listing)
+        # A cluster is regenerated once, through its head; members are adapted
+        # again from the head's new listing instead of generated themselves
+        head = adapted.get(listing['sku'])
+        if (res['status'] == "FAIL" and state.get('qa_regenerate') and not expired(deadline)
+                and (head is None or head in regenerated)):
+            try:
+                if head is None:
+                    retry = generate_for(chains, items[listing['sku']], state, res.get('issues'))
+                else:
+                    retry = adapt_listing(regenerated[head], items[head], items[listing['sku']])
+                retry_res = review_listing(review_chains, retry)
+                print(f"{'Regenerated' if head is None else 'Re-adapted'} listing for {listing['sku']}: {retry_res['status']}")
+                listing, res = retry, retry_res
+                if head is None:
+                    regenerated[listing['sku']] = listing
+            except Exception as e:
+                print(f"Failed to regenerate listing for {listing['sku']}: {e}")
+        listings.append(listing)
+        if res['status'] == "FAIL":
+            redlines.append(res)
+
+    producer.join()
+    if errors:
+        raise errors[0]
+
+    _write_listings(state, listings)
+    _write_redlines(state, redlines)
+    _write_deferred(state, deferred)
 
-    return {"listing_redlines": redlines}
\ No newline at end of file
+    degraded = []
+    if deferred:
+        degraded.append(degradation("listing_qa", "deferred to next run", len(deferred), ", ".join(deferred)))
+    if rule_only:
+        degraded.append(degradation("listing_qa", "rule-only QA", rule_only))
+    return {"listings": listings, "listing_redlines": redlines, "degradations": degraded,
+            "llm_output": llm_output("listing", chains, dropped=dropped) + llm_output("qa", review_chains, dropped=unreviewed)}
@@ -1,55 +1,141 @@
 import os
 import json
-import math
+import time
 import pandas as pd
 from src.state import AgentState
+from src.catalog import load_catalog, with_product_ids
+from src.feed import fetch_feed
+from src.reporting import stock_summary
+from src.pricing import price, DEFAULT_PRICING
+from src.shipping import chargeable_weight, worst_case_shipping, DIM_COLUMNS
+from src.storefront import StorefrontClient, diff_updates, sync_changes, load_sync_state, save_sync_state
+
+# Sourcing criteria
+MIN_STOCK = 10
+TOP_K = 10
+
+def select_top_skus(df: pd.DataFrame, k: int = TOP_K) -> pd.DataFrame:
+    # Multi-supplier catalogs: routing can fill an order from every offer in
+    # stock, so a product is ranked and published on its total stock; the
+    # cheapest offer in stock sets the cost basis
+    if 'product_id' in df.columns:
+        df = with_product_ids(df)
+        df = df[df['stock'] > 0]
+        landed = df['cost_price'] + worst_case_shipping(df)
+        df = (df.assign(_landed=landed, stock=df.groupby('product_id')['stock'].transform('sum'))
+              .sort_values(['_landed', 'supplier_lead_days', 'supplier_sku'])
+              .drop_duplicates('product_id')
+              .drop(columns='_landed'))
+
+    # Criteria: Stock >= 10.
+    filtered = df[df['stock'] >= MIN_STOCK]
+
+    # Pick top k based on stock level; SKU breaks ties so the pick is deterministic
+    return filtered.sort_values(by=['stock', 'supplier_sku'], ascending=[False, True]).head(k)
+
+def feed_agent(state: AgentState):
+    print("--- [0/7] Supplier Feed Agent ---")
+    url = state.get('catalog_url')
+    if not url:
+        print("Catalog is a local file, nothing to fetch.")
+        return {"feed_result": {"skipped": True}}
+
+    try:
+        result = fetch_feed(url, state['catalog_path'])
+    except Exception as e:
+        if not os.path.exists(state['catalog_path']):
+            raise
+        # Keep going on the last complete copy
+        print(f"Feed fetch failed ({e}), using the previous copy")
+        return {"feed_result": {"changed": False, "error": str(e)},
+                "degradations": [{"node": "feed", "mode": "stale catalog", "count": 1, "detail": str(e)}]}
+
+    if result['changed']:
+        print(f"Fetched {result['bytes']} bytes in {result['seconds']}s" + (" (resumed)" if result['resumed'] else ""))
+    else:
+        print("Feed not modified, reusing the parsed catalog.")
+    return {"feed_result": result}
 
 def sourcing_agent(state: AgentState):
     print("--- [1/7] Product Sourcing Agent ---")
-    df = pd.read_csv(state['catalog_path'])
-    
-    # Criteria: Stock >= 10. 
-    filtered = df[df['stock'] >= 10].copy()
-    
-    # Pick top 10 based on stock level
-    top_10 = filtered.sort_values(by='stock', ascending=False).head(10)
+    df = load_catalog(state['catalog_path'], node="sourcing", shard=state.get('catalog_shard'))
+    # Carry the courier's chargeable weight instead of the raw dimensions
+    df = df.assign(chargeable_kg=chargeable_weight(df).round(3)).drop(columns=DIM_COLUMNS, errors='ignore')
     
-    selected = top_10.to_dict(orient='records')
+    selected = select_top_skus(df).to_dict(orient='records')
     
     # Save artifact
     with open(os.path.join(state['output_dir'], "selection.json"), "w") as f:
         json.dump(selected, f, indent=2)
         
-    return {"selected_skus": selected, "raw_catalog": df.to_dict(orient='records')}
+    return {"selected_skus": selected, "catalog_stock": stock_summary(df['stock'])}
 
 def pricing_agent(state: AgentState):
     print("--- [2/7] Pricing & Stock Agent ---")
-    selected = state['selected_skus']
+    items = pd.DataFrame(state['selected_skus'])
     price_updates = []
     stock_updates = []
     
-    # Pricing Formula: P = (Cost + Shipping + 0.30) / 0.621
-    divisor = 0.621 
-    
-    for item in selected:
-        cost = float(item['cost_price'])
-        shipping = float(item['shipping_cost'])
-        
-        min_price = (cost + shipping + 0.30) / divisor
-        final_price = math.ceil(min_price * 2) / 2 # Round up to nearest 0.50
+    # Pricing Formula: P = (Cost + Shipping + 0.30) / 0.621, see src.pricing
+    # Shipping is the worst case over the destination rate cards, using
+    # chargeable (dimensional) weight, so the margin holds for every market.
+    if not items.empty:
+        shipping = worst_case_shipping(items).round(2)
+        cost_basis = (items['cost_price'] + shipping).round(2)
+        final_price = price(cost_basis.to_numpy(), **DEFAULT_PRICING)
         
-        price_updates.append({
-            "sku": item['supplier_sku'],
+        price_updates = pd.DataFrame({
+            "sku": items['supplier_sku'],
             "new_price": final_price,
-            "cost_basis": cost + shipping
-        })
+            "cost_basis": cost_basis,
+            "shipping_basis": shipping,
+        }).to_dict(orient='records')
         
-        stock_updates.append({
-            "sku": item['supplier_sku'],
-            "stock_level": item['stock']
-        })
+        stock_updates = pd.DataFrame({
+            "sku": items['supplier_sku'],
+            "stock_level": items['stock'],
+        }).to_dict(orient='records')
 
     pd.DataFrame(price_updates).to_csv(os.path.join(state['output_dir'], "price_update.csv"), index=False)
     pd.DataFrame(stock_updates).to_csv(os.path.join(state['output_dir'], "stock_update.csv"), index=False)
     
-    return {"price_updates": price_updates, "stock_updates": stock_updates}
\ No newline at end of file
+    return {"price_updates": price_updates, "stock_updates": stock_updates}
+
+def storefront_sync_agent(state: AgentState):
+    print("--- [2b/7] Storefront Sync Agent ---")
+    url = state.get('storefront_url')
+    if not url:
+        print("No storefront URL configured, skipping sync.")
+        return {"sync_result": {"skipped": True}}
+
+    state_path = os.path.join(state['output_dir'], "storefront_sync_state.json")
+    synced_state = load_sync_state(state_path)
+    changes = diff_updates(state['price_updates'], state['stock_updates'], synced_state)
+
+    client = StorefrontClient(url, token=os.getenv("SHOPIFY_ACCESS_TOKEN", ""))
+    start = time.perf_counter()
+    synced, failed = sync_changes(
+        client, changes,
+        batch_size=state.get('sync_batch_size', 100),
+        workers=state.get('sync_workers', 4),
+    )
+    elapsed = time.perf_counter() - start
+
+    # Only successfully pushed changes count as synced; failures retry next run
+    for item in synced:
+        synced_state.setdefault(item['sku'], {}).update({k: v for k, v in item.items() if k != 'sku'})
+    save_sync_state(state_path, synced_state)
+
+    result = {
+        "changes": len(changes),
+        "synced": len(synced),
+        "failed": len(failed),
+        "unchanged": len({u['sku'] for u in state['price_updates'] + state['stock_updates']}) - len(changes),
+        "seconds": round(elapsed, 3),
+        "items_per_second": round(len(synced) / elapsed, 1) if elapsed > 0 else None,
+    }
+    print(f"Synced {result['synced']}/{result['changes']} changed SKUs in {result['seconds']}s")
+    with open(os.path.join(state['output_dir'], "storefront_sync.json"), "w") as f:
+        json.dump(result, f, indent=2)
+
+    return {"sync_result": result}
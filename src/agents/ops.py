@@ -2,94 +2,147 @@ import os
 import json
 import pandas as pd
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
 from src.config import get_llm
 from src.state import AgentState
+from src.catalog import load_catalog, OfferIndex
+from src.deadline import node_deadline, expired, degradation, DeadlineExceeded
+from src import history, order_store
+from src.reporting import (
+    compute_report_stats, build_digest, fallback_summary,
+    render_daily_report, render_manager_report,
+)
+
+# Used instead of LLM drafts when routing runs out of time
+EMAIL_TEMPLATE = (
+    "Subject: Update on your order {order_id}\n\n"
+    "Dear Customer,\n\n{context}\n\n"
+    "Thank you for shopping with us.\n\nCustomer Service Team"
+)
 
 def order_routing_agent(state: AgentState):
     print("--- [5/7] Order Routing Agent ---")
-    orders_df = pd.read_csv(state['orders_path'])
-    raw_catalog = pd.DataFrame(state['raw_catalog'])
+    # Only orders not routed by an earlier run
+    store = order_store.connect(state['orders_db']) if state.get('orders_db') else None
+    if store:
+        orders_df, watermark = order_store.pending_orders(store, state['orders_path'])
+    else:
+        orders_df = pd.read_csv(state['orders_path'])
+    # Only the products these orders refer to; nothing to index without orders
+    offers = OfferIndex(load_catalog(state['catalog_path'], node="routing"), skus=orders_df['sku']) if len(orders_df) else None
     
     actions = []
-    llm = get_llm("qa") 
+    deadline = node_deadline(state, "routing")
+    llm = get_llm("email", deadline)
     
     email_prompt = ChatPromptTemplate.from_template(
         "Write a short customer service email regarding order {order_id}. Context: {context}. Keep it professional."
     )
     email_chain = email_prompt | llm | StrOutputParser()
+    templated = 0
     
     for _, order in orders_df.iterrows():
-        sku_data = raw_catalog[raw_catalog['supplier_sku'] == order['sku']]
-        
         action = {
             "order_id": order['order_id'],
             "sku": order['sku'],
             "action": "UNKNOWN",
+            "allocations": [],
             "email_draft": ""
         }
         
-        if sku_data.empty:
+        # Cheapest landed offers for the destination first; reroute or split when short
+        result = offers.allocate(order['sku'], int(order['quantity']), order.get('customer_country'))
+        action['allocations'] = result['allocations']
+        if result['outcome'] == "NOT_FOUND":
             action['action'] = "CANCEL_REFUND"
             context = "Item discontinued/not found."
+        elif result['outcome'] == "SINGLE":
+            action['action'] = "FULFILL_DROPSHIP"
+            action['rerouted'] = result['rerouted']
+            context = "Order confirmed and shipping soon."
+        elif result['outcome'] == "SPLIT":
+            action['action'] = "FULFILL_SPLIT"
+            context = f"Order confirmed and shipping soon in {len(result['allocations'])} separate parcels."
         else:
-            stock = sku_data.iloc[0]['stock']
-            if stock >= order['quantity']:
-                action['action'] = "FULFILL_DROPSHIP"
-                context = "Order confirmed and shipping soon."
-            else:
-                action['action'] = "BACKORDER"
-                context = f"Item temporarily out of stock. Expected delay: {sku_data.iloc[0]['supplier_lead_days']} days."
+            action['action'] = "BACKORDER"
+            context = f"Item temporarily out of stock. Expected delay: {result['lead_days']} days."
         
-        action['email_draft'] = email_chain.invoke({"order_id": order['order_id'], "context": context})
+        # The customer already heard about a backorder that is still short
+        if order.get('previous_action') == action['action']:
+            actions.append(action)
+            continue
+        try:
+            if expired(deadline):
+                raise DeadlineExceeded("Routing deadline reached")
+            action['email_draft'] = email_chain.invoke({"order_id": order['order_id'], "context": context})
+        except DeadlineExceeded:
+            action['email_draft'] = EMAIL_TEMPLATE.format(order_id=order['order_id'], context=context)
+            templated += 1
         actions.append(action)
         
     with open(os.path.join(state['output_dir'], "order_actions.json"), "w") as f:
         json.dump(actions, f, indent=2)
+
+    if store:
+        order_store.mark_processed(store, actions, state['run_id'], watermark, orders_df)
+        store.close()
         
-    return {"order_actions": actions}
+    degraded = [degradation("routing", "template emails", templated)] if templated else []
+    return {"order_actions": actions, "degradations": degraded}
 
 def reporter_agent(state: AgentState):
     print("--- [6/7] Reporter Agent ---")
-    llm = get_llm("listing")
-    
-    total_selected = len(state['selected_skus'])
-    total_listings = len(state['listings'])
-    qa_fails = len(state['listing_redlines'])
-    orders_processed = len(state['order_actions'])
-    
-    summary_prompt = f"""
-    Generate a Daily Operations Report in Markdown format.
-    Stats:
-    - SKUs Sourced: {total_selected}
-    - Listings Generated: {total_listings}
-    - QA Rejections: {qa_fails}
-    - Orders Processed: {orders_processed}
-    Listing Issues Found: {json.dumps(state['listing_redlines'])}
-    Include a section "Executive Summary" and "Action Items".
-    """
-    
-    report = llm.invoke(summary_prompt).content
+    stats = compute_report_stats(state)
+    if state.get('history_db'):
+        # File today's facts, then compare against the stored history
+        conn = history.connect(state['history_db'])
+        try:
+            history.record_run(conn, state['run_id'], state['run_date'], state)
+            stats['week_over_week'] = history.week_over_week(conn, state['run_date'])
+        finally:
+            conn.close()
+    summary = fallback_summary(stats)
+    degraded = []
+
+    # One optional LLM call writes both the executive summary and the manager
+    # recommendations from a fixed-size digest of the stats.
+    deadline = node_deadline(state, "reporting")
+    if state.get('llm_summary', True) and expired(deadline):
+        degraded.append(degradation("reporting", "rule-based summary", 1))
+    elif state.get('llm_summary', True):
+        llm = get_llm("manager", deadline)
+        prompt = ChatPromptTemplate.from_template(
+            """You are the operations manager of a Shopify dropshipping store.
+            Given today's run statistics, write a short executive summary and 3-5 high-level recommendations.
+            Output strictly JSON with keys: executive_summary (string), recommendations (list of strings).
+
+            Stats: {digest}
+            """
+        )
+        chain = prompt | llm | JsonOutputParser()
+        try:
+            res = chain.invoke({"digest": build_digest(stats)})
+            summary = {
+                "executive_summary": str(res['executive_summary']),
+                "recommendations": [str(r) for r in res['recommendations']],
+            }
+        except DeadlineExceeded:
+            degraded.append(degradation("reporting", "rule-based summary", 1))
+        except Exception as e:
+            print(f"Summary generation failed, using rule-based summary: {e}")
+
+    stats['degradations'] += degraded
+    report = render_daily_report(stats, summary)
     with open(os.path.join(state['output_dir'], "daily_report.md"), "w") as f:
         f.write(report)
-        
-    return {"daily_report": report}
+
+    return {"daily_report": report, "report_stats": stats, "report_summary": summary, "degradations": degraded}
 
 def manager_agent(state: AgentState):
     print("--- [7/7] Manager Agent ---")
-    llm = get_llm("manager")
-    
-    summary_prompt = f"""
-    Review all outputs and provide high-level recommendations.
-    Current State Summary:
-    - SKUs Selected: {len(state['selected_skus'])}
-    - Listings: {len(state['listings'])}
-    - QA Failures: {len(state['listing_redlines'])}
-    - Orders Processed: {len(state['order_actions'])}
-    """
-    
-    report = llm.invoke(summary_prompt).content
+    # Recommendations were produced alongside the daily report; just render them.
+    report = render_manager_report(state['report_stats'], state['report_summary'])
     with open(os.path.join(state['output_dir'], "manager_report.md"), "w") as f:
         f.write(report)
-        
-    return {"manager_report": report}
\ No newline at end of file
+
+    return {"manager_report": report}
@@ -0,0 +1,279 @@
+import os
+import json
+import hashlib
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.shipping import shipping_costs
+
+# Explicit supplier catalog schema. Money and weight stay float64 because they
+# end up in prices, prompts and JSON artifacts, where float32 rounding noise
+# would show; everything else is as narrow as the data allows.
+CATALOG_SCHEMA = {
+    "supplier_sku": "string",
+    "name": "string",
+    "category": "category",
+    "cost_price": "float64",
+    "stock": "int32",
+    "weight_kg": "float64",
+    "length_cm": "float32",
+    "width_cm": "float32",
+    "height_cm": "float32",
+    "image_url": "string",
+    "description": "string",
+    "brand": "category",
+    "shipping_cost": "float64",
+    "supplier_lead_days": "int16",
+    # Optional: several supplier rows (offers) can share a product_id
+    "product_id": "string",
+    "supplier": "category",
+}
+OPTIONAL_COLUMNS = {"product_id", "supplier"}
+
+# Columns each node actually reads
+NODE_COLUMNS = {
+    "sourcing": ["supplier_sku", "name", "category", "cost_price", "stock", "weight_kg",
+                 "length_cm", "width_cm", "height_cm",
+                 "description", "brand", "shipping_cost", "supplier_lead_days", "product_id"],
+    "routing": ["supplier_sku", "stock", "supplier_lead_days", "cost_price", "shipping_cost",
+                "weight_kg", "length_cm", "width_cm", "height_cm", "product_id", "supplier"],
+    "scenarios": ["supplier_sku", "cost_price", "shipping_cost", "weight_kg",
+                  "length_cm", "width_cm", "height_cm"],
+}
+
+CACHE_DIR = ".cache"
+# Cached column holding the hash shards are cut by (see shard_ids)
+PRODUCT_HASH = "_product_hash"
+
+try:
+    import pyarrow  # noqa: F401
+    CACHE_FORMAT = "parquet"
+except ImportError:
+    # Without pyarrow fall back to pickle, which still keeps the dtypes
+    CACHE_FORMAT = "pickle"
+
+
+def _file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _cache_paths(path: str):
+    base = os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR, os.path.basename(path))
+    return f"{base}.{CACHE_FORMAT}", f"{base}.meta.json"
+
+
+def _valid_cache_meta(path: str, meta_path: str, data_path: str) -> Optional[dict]:
+    if not (os.path.exists(meta_path) and os.path.exists(data_path)):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta.get("format") != CACHE_FORMAT or meta.get("schema") != CATALOG_SCHEMA:
+        return None
+    if PRODUCT_HASH not in meta.get("columns", []):
+        return None
+    st = os.stat(path)
+    if meta["mtime"] == st.st_mtime_ns and meta["size"] == st.st_size:
+        return meta
+    # Touched but maybe not changed: fall back to the content hash
+    if meta["size"] == st.st_size and meta["sha256"] == _file_hash(path):
+        meta["mtime"] = st.st_mtime_ns
+        _write_json(meta_path, meta)
+        return meta
+    return None
+
+
+def _project(columns: Optional[List[str]], available) -> Optional[List[str]]:
+    if columns is None:
+        return None
+    return [c for c in columns if c in available or c not in OPTIONAL_COLUMNS]
+
+
+def _write_json(path: str, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def read_catalog_csv(path: str) -> pd.DataFrame:
+    header = pd.read_csv(path, nrows=0).columns
+    dtypes = {c: t for c, t in CATALOG_SCHEMA.items() if c in header}
+    return pd.read_csv(path, dtype=dtypes)
+
+
+def load_catalog(path: str, columns: Optional[List[str]] = None, node: Optional[str] = None,
+                 shard: Optional[Tuple[int, int]] = None) -> pd.DataFrame:
+    """
+    Load the supplier catalog with the typed schema, projected to `columns`
+    (or the columns registered for `node`). Parsed catalogs are cached in a
+    sidecar file next to the CSV and reused until the source changes.
+    With shard=(i, n) only the rows of products in shard i of n are kept.
+    """
+    if columns is None and node is not None:
+        columns = NODE_COLUMNS[node]
+    if shard is not None and columns is not None:
+        columns = columns + [PRODUCT_HASH]
+    df = _load(path, columns)
+    if shard is not None:
+        i, n = shard
+        df = df[df[PRODUCT_HASH].to_numpy() % n == i]
+    if PRODUCT_HASH in df.columns:
+        df = df.drop(columns=PRODUCT_HASH)
+    return df
+
+
+def _load(path: str, columns: Optional[List[str]]) -> pd.DataFrame:
+    data_path, meta_path = _cache_paths(path)
+    meta = _valid_cache_meta(path, meta_path, data_path)
+    if meta:
+        columns = _project(columns, meta.get("columns", []))
+        if CACHE_FORMAT == "parquet":
+            return pd.read_parquet(data_path, columns=columns)
+        df = pd.read_pickle(data_path)
+        return df[columns] if columns else df
+
+    df = read_catalog_csv(path)
+    # Hashed once per source version, so shard workers only take a modulo
+    df[PRODUCT_HASH] = _hash(product_ids(df))
+    try:
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        tmp = data_path + ".tmp"
+        if CACHE_FORMAT == "parquet":
+            df.to_parquet(tmp, index=False)
+        else:
+            df.to_pickle(tmp)
+        os.replace(tmp, data_path)
+        st = os.stat(path)
+        _write_json(meta_path, {
+            "format": CACHE_FORMAT,
+            "schema": CATALOG_SCHEMA,
+            "mtime": st.st_mtime_ns,
+            "size": st.st_size,
+            "sha256": _file_hash(path),
+            "columns": list(df.columns),
+        })
+    except OSError as e:
+        print(f"Could not write catalog cache for {path}: {e}")
+    columns = _project(columns, df.columns)
+    return df[columns] if columns else df
+
+
+def product_ids(df: pd.DataFrame) -> pd.Series:
+    """Single-supplier catalogs have no product_id; each supplier SKU is its own product."""
+    if "product_id" not in df.columns:
+        return df["supplier_sku"]
+    return df["product_id"].fillna(df["supplier_sku"])
+
+
+def with_product_ids(df: pd.DataFrame) -> pd.DataFrame:
+    return df.assign(product_id=product_ids(df))
+
+
+def _hash(skus: pd.Series) -> np.ndarray:
+    return pd.util.hash_array(skus.astype(str).to_numpy())
+
+
+def shard_ids(skus: pd.Series, n: int) -> pd.Series:
+    """Stable shard id per SKU (same SKU -> same shard on every run)."""
+    return pd.Series(_hash(skus) % n, index=skus.index)
+
+
+class OfferIndex:
+    """
+    Supplier offers per product, pre-sorted by landed cost (per destination
+    country, plus a worst-case ranking for unknown destinations) then lead
+    time, so routing resolves an order's product with one hash lookup and
+    walks its offers best-first. Offers are held in numpy arrays; a ranking
+    is a row order in which each product's offers sit between two offsets.
+    Stock is drawn down as orders are allocated. With `skus` only the
+    products those SKUs (or product ids) refer to are indexed.
+    """
+
+    def __init__(self, df: pd.DataFrame, skus: Optional[Iterable[str]] = None):
+        df = with_product_ids(df)
+        if skus is not None:
+            skus = list(skus)
+            products = df.loc[df["supplier_sku"].isin(skus), "product_id"]
+            df = df[df["product_id"].isin(products) | df["product_id"].isin(skus)]
+        df = df.reset_index(drop=True)
+        if "supplier" not in df.columns:
+            df = df.assign(supplier=pd.NA)
+        shipping = shipping_costs(df)
+        landed = shipping.add(df["cost_price"].to_numpy(dtype=float), axis=0).round(2)
+
+        self.skus = df["supplier_sku"].to_numpy(dtype=object)
+        self.suppliers = df["supplier"].to_numpy(dtype=object)
+        self.stock = df["stock"].to_numpy(dtype=np.int64).copy()
+        self.lead_days = df["supplier_lead_days"].to_numpy(dtype=np.int64)
+        self.landed = landed.to_numpy()
+        self.landed_max = landed.max(axis=1).to_numpy()
+        self.country_col = {c: i for i, c in enumerate(landed.columns)}
+
+        # Resolve either a supplier SKU or a product id to the product's position
+        codes, products = pd.factorize(df["product_id"])
+        self.product_of = dict(zip(df["supplier_sku"], codes.tolist()))
+        self.product_of.update({p: i for i, p in enumerate(products)})
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(products)))])
+
+        # One row order per destination; stock is shared between them
+        keys = pd.DataFrame({"product": codes, "lead_days": self.lead_days, "sku": self.skus})
+        self.rankings = {}
+        for country in [None] + list(landed.columns):
+            cost = self.landed_max if country is None else self.landed[:, self.country_col[country]]
+            ranked = keys.assign(cost=cost).sort_values(["product", "cost", "lead_days", "sku"], kind="stable")
+            self.rankings[country] = ranked.index.to_numpy()
+
+    def _rows(self, sku: str, country: Optional[str]) -> np.ndarray:
+        product = self.product_of.get(sku)
+        if product is None:
+            return self.offsets[:0]
+        ranking = self.rankings.get(country, self.rankings[None])
+        return ranking[self.offsets[product]:self.offsets[product + 1]]
+
+    def allocate(self, sku: str, quantity: int, country: Optional[str] = None) -> dict:
+        """
+        Fill an order from the best offers. Prefers a single supplier that can
+        ship the whole quantity, otherwise splits across suppliers in cost
+        order. Returns the outcome and allocations without over-committing stock.
+        """
+        rows = self._rows(sku, country)
+        if not len(rows):
+            return {"outcome": "NOT_FOUND", "allocations": []}
+
+        stock = self.stock[rows]
+        fits = np.flatnonzero(stock >= quantity)
+        if len(fits):
+            row = rows[fits[0]]
+            self.stock[row] -= quantity
+            return {
+                "outcome": "SINGLE",
+                "rerouted": bool(fits[0]),
+                "allocations": [self._allocation(row, quantity, country)],
+            }
+
+        if stock.sum() >= quantity:
+            allocations, remaining = [], quantity
+            for row in rows:
+                take = min(int(self.stock[row]), remaining)
+                if take:
+                    self.stock[row] -= take
+                    remaining -= take
+                    allocations.append(self._allocation(row, take, country))
+                if not remaining:
+                    break
+            return {"outcome": "SPLIT", "allocations": allocations}
+
+        return {"outcome": "SHORT", "allocations": [], "lead_days": int(self.lead_days[rows].min())}
+
+    def _allocation(self, row: int, quantity: int, country: Optional[str]) -> dict:
+        col = self.country_col.get(country)
+        cost = self.landed_max[row] if col is None else self.landed[row, col]
+        supplier = self.suppliers[row]
+        return {"supplier_sku": self.skus[row], "supplier": None if pd.isna(supplier) else str(supplier),
+                "quantity": quantity, "landed_cost": float(cost)}
@@ -1,29 +1,69 @@
 import os
+import json
+from typing import Optional
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
-# from langchain_ollama import ChatOllama # Uncomment if using Ollama
+from src.router import ModelRouter, RoutedLLM
 
 # Load environment variables
 load_dotenv(override=True)
 
-def get_llm(role: str):
+def _gemini(model: str, temperature: float):
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model=model, temperature=temperature, google_api_key=os.getenv("GOOGLE_API_KEY"))
+
+def _ollama(model: str, temperature: float):
+    from langchain_ollama import ChatOllama
+    return ChatOllama(model=model, temperature=temperature)
+
+# Available model backends
+BACKENDS = {
+    "gemini-flash": {"factory": _gemini, "model": "gemini-2.0-flash", "cost_per_1k_tokens": 0.0004,
+                     "context_tokens": 1_048_576, "max_output_tokens": 8192, "structured_output": True},
+    # llama3 follows JSON schemas loosely, so its free text is parsed and repaired locally
+    "ollama-llama3": {"factory": _ollama, "model": "llama3", "cost_per_1k_tokens": 0.0,
+                      "context_tokens": 8192, "max_output_tokens": 4096, "structured_output": False},
+}
+
+# Per-role routing table. The primary is used while its observed p95 latency
+# and error rate stay within the targets, otherwise requests fail over.
+# budget_usd caps a role's spend per run (per process when sharded); past it
+# only free backends are used. max_cost_per_1k (optional) excludes pricier
+# backends outright.
+ROUTES = {
+    "listing": {"primary": "gemini-flash", "fallback": "ollama-llama3", "temperature": 0.7, "p95_ms": 8000, "max_error_rate": 0.2, "budget_usd": 2.0},
+    "qa":      {"primary": "ollama-llama3", "fallback": "gemini-flash", "temperature": 0.0, "p95_ms": 4000, "max_error_rate": 0.2, "budget_usd": 0.5},
+    "email":   {"primary": "ollama-llama3", "fallback": "gemini-flash", "temperature": 0.3, "p95_ms": 4000, "max_error_rate": 0.2, "budget_usd": 0.5},
+    "manager": {"primary": "gemini-flash", "fallback": "ollama-llama3", "temperature": 0.3, "p95_ms": 10000, "max_error_rate": 0.2, "budget_usd": 0.1},
+    "default": {"primary": "gemini-flash", "fallback": "ollama-llama3", "temperature": 0.5, "p95_ms": 8000, "max_error_rate": 0.2, "budget_usd": 1.0},
+}
+
+# Optional JSON file overriding entries of the routing table
+if os.getenv("LLM_ROUTES_FILE"):
+    with open(os.getenv("LLM_ROUTES_FILE")) as f:
+        for role, overrides in json.load(f).items():
+            ROUTES[role] = {**ROUTES.get(role, ROUTES["default"]), **overrides}
+
+ROUTER = ModelRouter(BACKENDS, ROUTES)
+
+def get_llm(role: str, deadline: Optional[float] = None):
+    """
+    Factory returning a routed model for the agent role. Calls made after
+    `deadline` (time.time()) raise DeadlineExceeded; calls before it may
+    use only the time left.
     """
-    Factory to switch models based on agent role.
+    return RoutedLLM(ROUTER, role, deadline)
+
+def model_limits(role: str):
     """
-    api_key = os.getenv("GOOGLE_API_KEY")
-    
-    if role == "listing":
-        return ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.7, google_api_key=api_key)
-
-    # computationally expensive
-    # elif role == "listing": 
-    #   return ChatOllama(model="llama3", temperature=0.7)
-
-    elif role == "qa":
-        return ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.0, google_api_key=api_key)
-    elif role == "manager":
-        return ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.3, google_api_key=api_key)
-    else:
-        return ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.5, google_api_key=api_key)
-
-  
\ No newline at end of file
+    Context and output token limits for a role. Takes the smaller of primary
+    and fallback, since either may serve the request.
+    """
+    route = ROUTER.route(role)
+    specs = [BACKENDS[b] for b in (route["primary"], route.get("fallback")) if b]
+    return {
+        "context_tokens": min(s["context_tokens"] for s in specs),
+        "max_output_tokens": min(s["max_output_tokens"] for s in specs),
+    }
+
+def routing_metrics():
+    return ROUTER.metrics()
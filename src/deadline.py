@@ -0,0 +1,48 @@
+import time
+from typing import Dict, Optional
+
+# Share of the whole run window each LLM-bound node may use, measured from
+# the node's own start.
+NODE_SHARES = {
+    "listing": 0.45,
+    "qa": 0.2,
+    "listing_qa": 0.65,
+    "routing": 0.2,
+    "reporting": 0.05,
+}
+
+# Seconds held back for the critical nodes downstream of a node. In degraded
+# mode these need no LLM, so they finish quickly.
+RESERVE_S = {
+    "routing": 5.0,
+    "reporting": 2.0,
+    "manager": 1.0,
+}
+
+NODE_ORDER = ["listing", "qa", "listing_qa", "routing", "reporting", "manager"]
+
+
+class DeadlineExceeded(TimeoutError):
+    """An LLM call ran into its node's deadline; the node degrades as if it had expired."""
+
+
+def node_deadline(state: Dict, node: str) -> Optional[float]:
+    """
+    Wall-clock time (time.time()) after which `node` must stop starting new
+    LLM calls and degrade, or None when the run has no deadline.
+    """
+    if not state.get('deadline'):
+        return None
+    total = state['deadline'] - state['run_started']
+    position = NODE_ORDER.index(node)
+    downstream = sum(s for n, s in RESERVE_S.items() if NODE_ORDER.index(n) > position)
+    return min(time.time() + NODE_SHARES.get(node, 1.0) * total, state['deadline'] - downstream)
+
+
+def expired(deadline: Optional[float]) -> bool:
+    return deadline is not None and time.time() >= deadline
+
+
+def degradation(node: str, mode: str, count: int, detail: str = "") -> Dict:
+    print(f"Deadline reached in {node}: {mode} for {count} item(s)")
+    return {"node": node, "mode": mode, "count": count, "detail": detail}
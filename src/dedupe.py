@@ -0,0 +1,122 @@
+import re
+from collections import defaultdict
+from typing import Dict, List
+
+import numpy as np
+
+# MinHash / LSH parameters. 16 bands x 4 rows puts the LSH candidate
+# threshold around Jaccard 0.5; candidates are then verified against
+# SIMILARITY_THRESHOLD using the signatures.
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+SIMILARITY_THRESHOLD = 0.7
+# Most SKUs one generated listing is reused for
+MAX_CLUSTER_SIZE = 20
+
+_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.default_rng(42)
+_A = _rng.integers(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+
+TEXT_FIELDS = ("name", "description", "category", "brand")
+_SHINGLE_WEIGHTS = np.array([256 ** i for i in reversed(range(SHINGLE_SIZE))], dtype=np.uint64)
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"[^a-z0-9 ]", " ", str(text).lower())).strip()
+
+
+def shingles(item: Dict) -> np.ndarray:
+    """Distinct character shingles of the normalized text fields, packed into integers."""
+    text = " | ".join(_normalize(item.get(f, "")) for f in TEXT_FIELDS).encode()
+    data = np.frombuffer(text.ljust(SHINGLE_SIZE), dtype=np.uint8).astype(np.uint64)
+    windows = np.lib.stride_tricks.sliding_window_view(data, SHINGLE_SIZE)
+    return np.unique(windows @ _SHINGLE_WEIGHTS)
+
+
+def minhash(item: Dict) -> np.ndarray:
+    hashes = shingles(item)
+    # (a*x + b) mod p for every permutation at once, then min per permutation.
+    # The product may wrap at 2**64 first, which is harmless for hashing.
+    return ((np.outer(hashes, _A) + _B) % _PRIME).min(axis=0)
+
+
+def cluster_products(items: List[Dict]) -> List[List[int]]:
+    """
+    Group near-duplicate products. Returns clusters as lists of indices into
+    `items`, the first index being the cluster representative.
+
+    LSH buckets only propose candidates. An item joins a cluster only if it
+    matches the cluster's representative itself, and only while the cluster
+    has fewer than MAX_CLUSTER_SIZE members. This stops chains of similar
+    pairs from merging unrelated products. Each bucket only proposes its
+    first member, so the work stays linear even when one bucket holds most
+    of the catalog.
+    """
+    n = len(items)
+    if n == 0:
+        return []
+    signatures = np.vstack([minhash(item) for item in items])
+
+    # Listings are category and brand specific, so never merge across either.
+    # Weight must match too: listings state it in any unit and wording, which
+    # cannot be rewritten reliably for another member.
+    _, keys = np.unique([f"{item.get('category', '')}\x00{item.get('brand', '')}\x00{item.get('weight_kg', '')}"
+                         for item in items], return_inverse=True)
+    index = np.arange(n)
+    heads = np.empty((n, BANDS), dtype=np.int64)
+    for band in range(BANDS):
+        rows = np.ascontiguousarray(signatures[:, band * ROWS:(band + 1) * ROWS])
+        _, first, bucket = np.unique(rows.view(f"V{rows.itemsize * ROWS}").ravel(), return_index=True, return_inverse=True)
+        heads[:, band] = first[bucket]
+    # Bucket heads are the lowest index in their bucket, so in index order
+    # every candidate's cluster is settled before it is needed
+    candidates = (heads != index[:, None]) & (keys[heads] == keys[:, None])
+
+    leader = index.copy()
+    size = np.ones(n, dtype=np.int64)
+    for i in np.flatnonzero(candidates.any(axis=1)):
+        options = np.unique(leader[heads[i, candidates[i]]])
+        options = options[size[options] < MAX_CLUSTER_SIZE]
+        if not len(options):
+            continue
+        similarity = (signatures[options] == signatures[i]).mean(axis=1)
+        best = similarity.argmax()
+        if similarity[best] >= SIMILARITY_THRESHOLD:
+            leader[i] = options[best]
+            size[options[best]] += 1
+
+    clusters = defaultdict(list)
+    for i, head in enumerate(leader.tolist()):
+        clusters[head].append(i)
+    return sorted(clusters.values(), key=lambda c: c[0])
+
+
+def _substitute(value, replacements):
+    if isinstance(value, str):
+        for pattern, repl in replacements:
+            value = pattern.sub(repl, value)
+        return value
+    if isinstance(value, list):
+        return [_substitute(v, replacements) for v in value]
+    if isinstance(value, dict):
+        return {k: _substitute(v, replacements) for k, v in value.items()}
+    return value
+
+
+def adapt_listing(listing: Dict, source: Dict, target: Dict) -> Dict:
+    """
+    Fill the SKU-specific fields of a cluster's canonical listing for another
+    member. Cluster members share category, brand and weight, so only the
+    name differs.
+    """
+    replacements = []
+    old, new = str(source['name']), str(target['name'])
+    if old != new:
+        pattern = re.compile(r"(?<!\w)" + re.escape(old) + r"(?!\w)", re.IGNORECASE)
+        replacements.append((pattern, lambda m: new))
+    adapted = {k: _substitute(v, replacements) for k, v in listing.items()}
+    adapted['sku'] = target['supplier_sku']
+    return adapted
@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import urllib.request
+import urllib.error
+from http.client import IncompleteRead
+from typing import Dict, Optional
+
+# Bytes per read/write while streaming the feed to disk
+CHUNK_BYTES = 1 << 20
+# Attempts per fetch; after a dropped connection the next attempt resumes
+FETCH_ATTEMPTS = 3
+
+
+def is_url(path: str) -> bool:
+    return path.startswith(("http://", "https://"))
+
+
+def feed_path(url: str, feed_dir: str) -> str:
+    """Local copy of a feed URL, named after the last path segment."""
+    name = os.path.basename(urllib.request.urlparse(url).path) or "supplier_catalog.csv"
+    return os.path.join(feed_dir, name)
+
+
+def _load_meta(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_meta(path: str, meta: Dict):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _validator(meta: Dict) -> Optional[str]:
+    return meta.get("etag") or meta.get("last_modified")
+
+
+def _request(url: str, meta: Dict, part_meta: Dict, part_size: int) -> urllib.request.Request:
+    req = urllib.request.Request(url)
+    if meta.get("url") == url and meta.get("etag"):
+        req.add_header("If-None-Match", meta["etag"])
+    if meta.get("url") == url and meta.get("last_modified"):
+        req.add_header("If-Modified-Since", meta["last_modified"])
+    # Resume a partial download only if it is still the same version
+    if part_size and part_meta.get("url") == url and _validator(part_meta):
+        req.add_header("Range", f"bytes={part_size}-")
+        req.add_header("If-Range", _validator(part_meta))
+    return req
+
+
+def _stream(resp, part: str, append: bool, expected: Optional[int], progress: Dict):
+    """Write the body to `part`, adding to progress['bytes'] as it goes (also when interrupted)."""
+    written = 0
+    with open(part, "ab" if append else "wb") as f:
+        while True:
+            chunk = resp.read(CHUNK_BYTES)
+            if not chunk:
+                break
+            f.write(chunk)
+            written += len(chunk)
+            progress['bytes'] += len(chunk)
+    if expected is not None and written < expected:
+        raise IncompleteRead(b"", expected - written)
+
+
+def fetch_feed(url: str, dest: str, timeout: float = 60.0) -> Dict:
+    """
+    Conditionally download `url` to `dest`. The ETag/Last-Modified of the
+    local copy are sent with the request; a 304 leaves the file (and its
+    parsed catalog cache) untouched. Downloads stream to `dest.part`, so a
+    dropped connection resumes with a Range request on the next attempt.
+    Returns {"changed", "status", "bytes", "resumed", "seconds"}.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+    meta_path, part, part_meta_path = dest + ".feed.json", dest + ".part", dest + ".part.json"
+    meta = _load_meta(meta_path) if os.path.exists(dest) else {}
+    start = time.perf_counter()
+    progress, resumed = {"bytes": 0}, False
+    last_error = None
+
+    for attempt in range(1, FETCH_ATTEMPTS + 1):
+        part_meta = _load_meta(part_meta_path)
+        part_size = os.path.getsize(part) if os.path.exists(part) else 0
+        try:
+            with urllib.request.urlopen(_request(url, meta, part_meta, part_size), timeout=timeout) as resp:
+                length = resp.headers.get("Content-Length")
+                append = resp.status == 206
+                new_meta = {
+                    "url": url,
+                    "etag": resp.headers.get("ETag") if not append else part_meta.get("etag"),
+                    "last_modified": resp.headers.get("Last-Modified") if not append else part_meta.get("last_modified"),
+                }
+                if append:
+                    first = int(resp.headers.get("Content-Range", "bytes 0-").split()[1].split("-")[0])
+                    if first != part_size:
+                        raise ValueError(f"Feed resumed at byte {first}, expected {part_size}")
+                    resumed = True
+                _save_meta(part_meta_path, new_meta)
+                _stream(resp, part, append, int(length) if length else None, progress)
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return {"changed": False, "status": 304, "bytes": 0, "resumed": False,
+                        "seconds": round(time.perf_counter() - start, 3)}
+            if e.code == 416 and part_size:
+                # Stale partial file: start over
+                os.remove(part)
+                last_error = e
+                continue
+            raise
+        except (IncompleteRead, ConnectionError, TimeoutError, urllib.error.URLError) as e:
+            if attempt == FETCH_ATTEMPTS:
+                raise
+            print(f"Feed download interrupted ({e.__class__.__name__}), resuming (attempt {attempt + 1})")
+            last_error = e
+            continue
+
+        os.replace(part, dest)
+        os.remove(part_meta_path)
+        _save_meta(meta_path, {**new_meta, "size": os.path.getsize(dest), "fetched_at": time.time()})
+        return {"changed": True, "status": 206 if resumed else 200, "bytes": progress['bytes'], "resumed": resumed,
+                "seconds": round(time.perf_counter() - start, 3)}
+    raise RuntimeError(f"Feed {url} not fetched after {FETCH_ATTEMPTS} attempts: {last_error}")
@@ -1,29 +1,40 @@
 from langgraph.graph import StateGraph, END
 from src.state import AgentState
+from src.profiling import profile_node
 
 # Import agents from their respective modules
-from src.agents.inventory import sourcing_agent, pricing_agent
-from src.agents.content import listing_agent, qa_agent
+from src.agents.inventory import feed_agent, sourcing_agent, pricing_agent, storefront_sync_agent
+from src.agents.content import listing_agent, qa_agent, listing_qa_pipeline_agent
 from src.agents.ops import order_routing_agent, reporter_agent, manager_agent
 
 def build_graph():
     workflow = StateGraph(AgentState)
     
     # Add Nodes
-    workflow.add_node("sourcing", sourcing_agent)
-    workflow.add_node("pricing", pricing_agent)
-    workflow.add_node("listing", listing_agent)
-    workflow.add_node("qa", qa_agent)
-    workflow.add_node("routing", order_routing_agent)
-    workflow.add_node("reporting", reporter_agent)
-    workflow.add_node("manager", manager_agent)
+    workflow.add_node("feed", profile_node("feed", feed_agent))
+    workflow.add_node("sourcing", profile_node("sourcing", sourcing_agent))
+    workflow.add_node("pricing", profile_node("pricing", pricing_agent))
+    workflow.add_node("storefront_sync", profile_node("storefront_sync", storefront_sync_agent))
+    workflow.add_node("listing", profile_node("listing", listing_agent))
+    workflow.add_node("qa", profile_node("qa", qa_agent))
+    workflow.add_node("listing_qa", profile_node("listing_qa", listing_qa_pipeline_agent))
+    workflow.add_node("routing", profile_node("routing", order_routing_agent))
+    workflow.add_node("reporting", profile_node("reporting", reporter_agent))
+    workflow.add_node("manager", profile_node("manager", manager_agent))
     
     # Define Edges
-    workflow.set_entry_point("sourcing")
+    workflow.set_entry_point("feed")
+    workflow.add_edge("feed", "sourcing")
     workflow.add_edge("sourcing", "pricing")
-    workflow.add_edge("pricing", "listing")
+    workflow.add_edge("pricing", "storefront_sync")
+    workflow.add_conditional_edges(
+        "storefront_sync",
+        lambda state: "listing_qa" if state.get("pipeline_listing_qa") else "listing",
+        {"listing": "listing", "listing_qa": "listing_qa"},
+    )
     workflow.add_edge("listing", "qa")
     workflow.add_edge("qa", "routing")
+    workflow.add_edge("listing_qa", "routing")
     workflow.add_edge("routing", "reporting")
     workflow.add_edge("reporting", "manager")
     workflow.add_edge("manager", END)
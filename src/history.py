@@ -0,0 +1,109 @@
+import sqlite3
+from collections import Counter
+from datetime import date, timedelta
+from typing import Dict
+
+from src.reporting import classify_issue
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    run_date TEXT NOT NULL,
+    started_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS prices (
+    run_id TEXT, run_date TEXT, sku TEXT, price REAL, cost_basis REAL
+);
+CREATE TABLE IF NOT EXISTS stock (
+    run_id TEXT, run_date TEXT, sku TEXT, stock INTEGER
+);
+CREATE TABLE IF NOT EXISTS order_actions (
+    run_id TEXT, run_date TEXT, order_id TEXT, sku TEXT, action TEXT
+);
+CREATE TABLE IF NOT EXISTS redlines (
+    run_id TEXT, run_date TEXT, sku TEXT, category TEXT, issue TEXT
+);
+CREATE TABLE IF NOT EXISTS node_timings (
+    run_id TEXT, run_date TEXT, node TEXT, seconds REAL
+);
+CREATE INDEX IF NOT EXISTS idx_runs_date ON runs (run_date);
+CREATE INDEX IF NOT EXISTS idx_prices_sku_date ON prices (sku, run_date);
+CREATE INDEX IF NOT EXISTS idx_prices_date ON prices (run_date);
+CREATE INDEX IF NOT EXISTS idx_stock_sku_date ON stock (sku, run_date);
+CREATE INDEX IF NOT EXISTS idx_stock_date ON stock (run_date);
+CREATE INDEX IF NOT EXISTS idx_orders_sku_date ON order_actions (sku, run_date);
+CREATE INDEX IF NOT EXISTS idx_orders_date ON order_actions (run_date);
+CREATE INDEX IF NOT EXISTS idx_redlines_sku_date ON redlines (sku, run_date);
+CREATE INDEX IF NOT EXISTS idx_redlines_date ON redlines (run_date);
+CREATE INDEX IF NOT EXISTS idx_timings_date ON node_timings (run_date);
+"""
+
+
+def connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def record_run(conn: sqlite3.Connection, run_id: str, run_date: str, state: Dict):
+    """Store the key facts of one run. Re-recording the same run_id replaces it."""
+    with conn:
+        for table in ("runs", "prices", "stock", "order_actions", "redlines", "node_timings"):
+            conn.execute(f"DELETE FROM {table} WHERE run_id = ?", (run_id,))
+        conn.execute("INSERT INTO runs VALUES (?, ?, ?)", (run_id, run_date, state.get('run_started', 0.0)))
+        conn.executemany("INSERT INTO prices VALUES (?, ?, ?, ?, ?)", [
+            (run_id, run_date, p['sku'], float(p['new_price']), float(p['cost_basis']))
+            for p in state.get('price_updates', [])
+        ])
+        conn.executemany("INSERT INTO stock VALUES (?, ?, ?, ?)", [
+            (run_id, run_date, s['sku'], int(s['stock_level'])) for s in state.get('stock_updates', [])
+        ])
+        conn.executemany("INSERT INTO order_actions VALUES (?, ?, ?, ?, ?)", [
+            (run_id, run_date, str(a['order_id']), a['sku'], a['action']) for a in state.get('order_actions', [])
+        ])
+        conn.executemany("INSERT INTO redlines VALUES (?, ?, ?, ?, ?)", [
+            (run_id, run_date, r['sku'], classify_issue(issue), str(issue))
+            for r in state.get('listing_redlines', []) for issue in r.get('issues', [])
+        ])
+        conn.executemany("INSERT INTO node_timings VALUES (?, ?, ?, ?)", [
+            (run_id, run_date, t['node'], float(t['seconds'])) for t in state.get('node_timings', [])
+        ])
+
+
+def _window_stats(conn: sqlite3.Connection, start: str, end: str) -> Dict:
+    """Aggregates over runs with start <= run_date <= end."""
+    q = lambda sql: conn.execute(sql, (start, end)).fetchone()
+    runs, = q("SELECT COUNT(*) FROM runs WHERE run_date BETWEEN ? AND ?")
+    avg_price, = q("SELECT AVG(price) FROM prices WHERE run_date BETWEEN ? AND ?")
+    avg_margin, = q("SELECT AVG((price - cost_basis) / price) FROM prices WHERE run_date BETWEEN ? AND ?")
+    avg_stock, = q("SELECT AVG(stock) FROM stock WHERE run_date BETWEEN ? AND ?")
+    actions = Counter(dict(conn.execute(
+        "SELECT action, COUNT(DISTINCT order_id) FROM order_actions WHERE run_date BETWEEN ? AND ? GROUP BY action",
+        (start, end)).fetchall()))
+    redlined, = q("SELECT COUNT(DISTINCT sku || run_id) FROM redlines WHERE run_date BETWEEN ? AND ?")
+    run_seconds, = q("""SELECT AVG(total) FROM (SELECT SUM(seconds) AS total FROM node_timings
+                        WHERE run_date BETWEEN ? AND ? GROUP BY run_id)""")
+    return {
+        "runs": runs,
+        "orders": sum(actions.values()),
+        "backorders": actions.get("BACKORDER", 0),
+        "cancellations": actions.get("CANCEL_REFUND", 0),
+        "qa_rejections": redlined,
+        "avg_price": avg_price,
+        "avg_gross_margin": avg_margin,
+        "avg_stock": avg_stock,
+        "avg_run_seconds": run_seconds,
+    }
+
+
+def week_over_week(conn: sqlite3.Connection, run_date: str) -> Dict:
+    """This week (run_date and the 6 days before) against the 7 days before that."""
+    end = date.fromisoformat(run_date)
+    this_week = _window_stats(conn, (end - timedelta(days=6)).isoformat(), end.isoformat())
+    last_week = _window_stats(conn, (end - timedelta(days=13)).isoformat(), (end - timedelta(days=7)).isoformat())
+    deltas = {}
+    for key, current in this_week.items():
+        previous = last_week[key]
+        change = None if current is None or previous is None else round(current - previous, 4)
+        deltas[key] = {"this_week": current, "last_week": previous, "change": change}
+    return deltas
@@ -0,0 +1,134 @@
+"""
+Local stand-in for a supplier's catalog feed, for offline testing of
+conditional and resumable fetching:
+
+    python -m src.mock_feed --port 8766 --rows 500000 --drop-after 1000000
+    python main.py --catalog http://127.0.0.1:8766/supplier_catalog.csv ...
+
+The feed answers If-None-Match/If-Modified-Since with 304 and honours
+Range/If-Range. `--drop-after` cuts the first full download after that
+many bytes so resumption can be exercised. POST /bump publishes a new
+version (stock levels change).
+"""
+import io
+import time
+import random
+import hashlib
+import argparse
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CATEGORIES = ["Electronics", "Home", "Fitness", "Accessories"]
+HEADER = ("supplier_sku,name,category,cost_price,stock,weight_kg,length_cm,width_cm,height_cm,"
+          "image_url,description,brand,shipping_cost,supplier_lead_days\n")
+
+
+def generate_feed(rows: int, version: int) -> bytes:
+    """Synthetic catalog in the data_gen.py layout; stock depends on `version`."""
+    rng = random.Random(rows)
+    stock_rng = random.Random(f"{rows}-{version}")
+    out = io.StringIO()
+    out.write(HEADER)
+    for i in range(1, rows + 1):
+        out.write(f"SKU-{1000 + i},Generic Product {i},{rng.choice(CATEGORIES)},{rng.uniform(5.0, 50.0):.2f},"
+                  f"{stock_rng.randint(0, 50)},{rng.uniform(0.1, 2.0):.1f},10,10,10,http://img.com/{i}.jpg,"
+                  f"A high quality generic product {i} for your needs.,GenericBrand,5.0,3\n")
+    return out.getvalue().encode()
+
+
+class MockFeed(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, rows: int = 100000, drop_after: int = 0):
+        super().__init__(address, MockFeedHandler)
+        self.rows = rows
+        self.drop_after = drop_after
+        self.requests = []
+        self.lock = threading.Lock()
+        self.publish(1)
+
+    def publish(self, version: int):
+        self.version = version
+        self.body = generate_feed(self.rows, version)
+        self.etag = '"' + hashlib.sha256(self.body).hexdigest()[:16] + '"'
+        self.last_modified = formatdate(time.time(), usegmt=True)
+
+
+class MockFeedHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _not_modified(self) -> bool:
+        etag = self.headers.get("If-None-Match")
+        if etag is not None:
+            return etag == self.server.etag
+        since = self.headers.get("If-Modified-Since")
+        if since:
+            return parsedate_to_datetime(since) >= parsedate_to_datetime(self.server.last_modified)
+        return False
+
+    def do_POST(self):
+        if self.path != "/bump":
+            self.send_error(404)
+            return
+        with self.server.lock:
+            self.server.publish(self.server.version + 1)
+        self.send_response(204)
+        self.end_headers()
+
+    def do_GET(self):
+        with self.server.lock:
+            body, etag, last_modified = self.server.body, self.server.etag, self.server.last_modified
+            self.server.requests.append({k: self.headers.get(k) for k in ("If-None-Match", "Range")})
+        if self._not_modified():
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        start = 0
+        byte_range = self.headers.get("Range")
+        if byte_range and self.headers.get("If-Range", etag) in (etag, last_modified):
+            start = int(byte_range.split("=")[1].split("-")[0])
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(body)}")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "text/csv")
+        self.send_header("Content-Length", str(len(body) - start))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+        end = len(body)
+        with self.server.lock:
+            if self.server.drop_after and start == 0:
+                end, self.server.drop_after = self.server.drop_after, 0
+        self.wfile.write(memoryview(body)[start:end])
+        if end < len(body):
+            self.close_connection = True
+
+
+def start(port: int = 0, rows: int = 100000, drop_after: int = 0) -> MockFeed:
+    """Run the mock feed in a background thread; returns the server (see server.server_port)."""
+    server = MockFeed(("127.0.0.1", port), rows, drop_after)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock supplier catalog feed")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--rows", type=int, default=100000, help="Catalog rows in the feed")
+    parser.add_argument("--drop-after", type=int, default=0, help="Cut the first full download after this many bytes")
+    args = parser.parse_args()
+    server = MockFeed(("127.0.0.1", args.port), args.rows, args.drop_after)
+    print(f"Mock feed ({len(server.body)} bytes) at http://127.0.0.1:{args.port}/supplier_catalog.csv")
+    server.serve_forever()
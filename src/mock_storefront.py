@@ -0,0 +1,81 @@
+"""
+Local stand-in for the storefront bulk update API, for offline testing and
+sync benchmarks:
+
+    python -m src.mock_storefront --port 8765 --latency-ms 50 --fail-rate 0.05
+    python main.py ... --storefront-url http://127.0.0.1:8765
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockStorefront(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency_ms: float = 0.0, fail_rate: float = 0.0):
+        super().__init__(address, MockStorefrontHandler)
+        self.latency_ms = latency_ms
+        self.fail_rate = fail_rate
+        self.products = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+class MockStorefrontHandler(BaseHTTPRequestHandler):
+    def _send(self, code: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/products":
+            with self.server.lock:
+                self._send(200, {"products": self.server.products, "requests": self.server.requests})
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/bulk_update":
+            self._send(404, {"error": "not found"})
+            return
+        items = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["items"]
+        time.sleep(self.server.latency_ms / 1000)
+        if random.random() < self.server.fail_rate:
+            self._send(429, {"error": "throttled"}, {"Retry-After": "0.1"})
+            return
+        with self.server.lock:
+            self.server.requests += 1
+            for item in items:
+                self.server.products.setdefault(item["sku"], {}).update(
+                    {k: v for k, v in item.items() if k != "sku"})
+        self._send(200, {"updated": len(items)})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start(port: int = 0, latency_ms: float = 0.0, fail_rate: float = 0.0) -> MockStorefront:
+    """Start the mock storefront on a background thread; port 0 picks a free port."""
+    server = MockStorefront(("127.0.0.1", port), latency_ms, fail_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock storefront bulk update API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added latency per request")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    args = parser.parse_args()
+    server = MockStorefront(("127.0.0.1", args.port), args.latency_ms, args.fail_rate)
+    print(f"Mock storefront listening on http://127.0.0.1:{args.port}")
+    server.serve_forever()
@@ -0,0 +1,118 @@
+import io
+import os
+import json
+import time
+import hashlib
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS processed_orders (
+    order_id TEXT PRIMARY KEY,
+    sku TEXT,
+    action TEXT,
+    run_id TEXT,
+    processed_at REAL,
+    record TEXT
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_processed_action ON processed_orders (action);
+CREATE TABLE IF NOT EXISTS watermarks (
+    path TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL,
+    head_sha256 TEXT NOT NULL
+);
+"""
+
+# Bytes hashed at the start of an orders file to notice it was replaced
+# rather than appended to
+HEAD_BYTES = 65536
+# Max order ids per membership query (SQLite variable limit)
+LOOKUP_BATCH = 900
+
+
+def connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _head_hash(path: str, length: int) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read(min(length, HEAD_BYTES))).hexdigest()
+
+
+def processed_ids(conn: sqlite3.Connection, order_ids: List[str]) -> set:
+    """The subset of `order_ids` already in the store (primary-key lookups)."""
+    found = set()
+    for i in range(0, len(order_ids), LOOKUP_BATCH):
+        batch = order_ids[i:i + LOOKUP_BATCH]
+        found.update(r[0] for r in conn.execute(
+            f"SELECT order_id FROM processed_orders WHERE order_id IN ({','.join('?' * len(batch))})", batch))
+    return found
+
+
+def pending_orders(conn: sqlite3.Connection, path: str) -> Tuple[pd.DataFrame, Dict]:
+    """
+    Orders in `path` that have not been processed yet, plus the watermark to
+    commit once they are. Only the bytes after the file's last watermark are
+    parsed; a trailing line without a newline is left for the next run, as
+    the export may still be writing it. A file that shrank or whose start
+    changed is read again from the top. Backordered orders stay pending
+    and are routed again on every run until stock allows fulfilment; their
+    rows carry the earlier outcome in `previous_action`.
+    """
+    key = os.path.realpath(path)
+    row = conn.execute("SELECT offset, head_sha256 FROM watermarks WHERE path = ?", (key,)).fetchone()
+    offset = 0
+    if row and os.path.getsize(path) >= row[0] and _head_hash(path, row[0]) == row[1]:
+        offset = row[0]
+
+    with open(path, "rb") as f:
+        header = f.readline()
+        start = max(offset, len(header))
+        f.seek(start)
+        tail = f.read()
+    end = tail.rfind(b"\n") + 1
+    orders = pd.read_csv(io.BytesIO(header + tail[:end]))
+
+    ids = orders['order_id'].astype(str)
+    seen = processed_ids(conn, ids.unique().tolist())
+    fresh = orders[~ids.isin(seen) & ~ids.duplicated()]
+    skipped = len(orders) - len(fresh)
+
+    backorders = pd.DataFrame([{**json.loads(r[0]), "previous_action": r[1]} for r in conn.execute(
+        "SELECT record, action FROM processed_orders WHERE action = 'BACKORDER' AND record IS NOT NULL")])
+    if offset or skipped or len(backorders):
+        print(f"Orders: {len(fresh)} new, {len(backorders)} backorders to re-route, "
+              f"{skipped} already processed, {offset} bytes skipped")
+    if len(backorders):
+        fresh = pd.concat([backorders, fresh], ignore_index=True)
+        fresh = fresh[~fresh['order_id'].astype(str).duplicated()]
+    watermark = {"path": key, "offset": start + end, "head_sha256": _head_hash(path, start + end)}
+    return fresh.reset_index(drop=True), watermark
+
+
+def mark_processed(conn: sqlite3.Connection, actions: List[Dict], run_id: str, watermark: Optional[Dict] = None,
+                   orders: Optional[pd.DataFrame] = None):
+    """
+    Record routed orders and advance the file watermark in one transaction.
+    The order rows in `orders` are kept so backorders can be routed again.
+    """
+    now = time.time()
+    records = {}
+    if orders is not None:
+        rows = orders.drop(columns=['previous_action'], errors='ignore').to_dict(orient='records')
+        records = {str(r['order_id']): json.dumps(r, default=str) for r in rows}
+    with conn:
+        conn.executemany("""INSERT INTO processed_orders VALUES (?, ?, ?, ?, ?, ?)
+                            ON CONFLICT (order_id) DO UPDATE SET
+                                action = excluded.action, run_id = excluded.run_id,
+                                processed_at = excluded.processed_at,
+                                record = COALESCE(excluded.record, processed_orders.record)""", [
+            (str(a['order_id']), a['sku'], a['action'], run_id, now, records.get(str(a['order_id'])))
+            for a in actions
+        ])
+        if watermark:
+            conn.execute("INSERT OR REPLACE INTO watermarks VALUES (:path, :offset, :head_sha256)", watermark)
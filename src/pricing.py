@@ -0,0 +1,151 @@
+"""
+Pricing formula and what-if scenario sweeps.
+
+    P = (cost_basis + fee_fixed) / (1 - fee_pct - tax - margin), rounded up to `rounding`
+
+The defaults (25% margin, 2.9% + $0.30 payment fee, 10% GST, $0.50 steps)
+give the store's 0.621 divisor. A sweep evaluates every SKU x scenario in
+one broadcast and keeps the matrices as float32, one contiguous row per
+scenario, so each scenario is a ready-made column of the output.
+
+    python -m src.pricing --catalog data/supplier_catalog.csv --out out/ \\
+        --margin 0.2,0.25,0.3 --fee-pct 0.029 --tax 0.1 --rounding 0.5,1
+"""
+import os
+import argparse
+from typing import Dict, Sequence
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_PRICING = {
+    "margin": 0.25,     # Target share of the price kept as contribution
+    "fee_pct": 0.029,   # Payment processor % fee
+    "fee_fixed": 0.30,  # Payment processor fixed fee per order
+    "tax": 0.10,        # GST included in the price
+    "rounding": 0.50,   # Round prices up to this step (0 = no rounding)
+}
+PARAMS = list(DEFAULT_PRICING)
+
+# SKUs evaluated per block; bounds the float64 temporaries to ~100 MB at 100 scenarios
+CHUNK_SKUS = 131072
+
+
+def price(cost_basis, margin, fee_pct, fee_fixed, tax, rounding):
+    """Listing price for a cost basis. Every argument broadcasts."""
+    raw = (cost_basis + fee_fixed) / (1.0 - fee_pct - tax - margin)
+    step = np.where(rounding > 0, rounding, 1.0)
+    return np.where(rounding > 0, np.ceil(raw / step) * step, raw)
+
+
+def scenario_grid(**grids: Sequence[float]) -> pd.DataFrame:
+    """
+    Every combination of the given parameter values, one row per scenario.
+    Parameters that are not given keep their DEFAULT_PRICING value.
+    """
+    unknown = set(grids) - set(PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown pricing parameter(s): {', '.join(sorted(unknown))}")
+    axes = [np.asarray(grids.get(p) or [DEFAULT_PRICING[p]], dtype=float) for p in PARAMS]
+    mesh = np.meshgrid(*axes, indexing="ij")
+    scenarios = pd.DataFrame({p: m.ravel() for p, m in zip(PARAMS, mesh)})
+    bad = scenarios['fee_pct'] + scenarios['tax'] + scenarios['margin'] >= 1.0
+    if bad.any():
+        raise ValueError("margin + fee_pct + tax must stay below 1 in every scenario")
+    scenarios.index = [f"S{i:03d}" for i in range(len(scenarios))]
+    return scenarios
+
+
+def sweep(cost_basis: np.ndarray, scenarios: pd.DataFrame, chunk: int = CHUNK_SKUS) -> Dict:
+    """
+    Prices and per-unit contribution for every scenario x SKU, shaped
+    (scenarios, SKUs), plus per-scenario summary stats.
+
+    Contribution is what a sale leaves after cost, payment fees and tax.
+    The break-even price is where it reaches zero; margin of safety is how
+    far the price sits above it, as a share of the price.
+    """
+    cost_basis = np.asarray(cost_basis, dtype=float)
+    n, s = len(cost_basis), len(scenarios)
+    p = {k: scenarios[k].to_numpy()[:, None] for k in PARAMS}
+    keep_share = 1.0 - p['fee_pct'] - p['tax']
+
+    prices = np.empty((s, n), dtype=np.float32)
+    contribution = np.empty((s, n), dtype=np.float32)
+    sums = {k: np.zeros(s) for k in ("price", "contribution", "margin_pct", "breakeven", "safety")}
+    min_safety = np.full(s, np.inf)
+
+    for lo in range(0, n, chunk):
+        cost = cost_basis[None, lo:lo + chunk]
+        block = price(cost, **p)
+        contrib = block * keep_share - cost - p['fee_fixed']
+        breakeven = (cost + p['fee_fixed']) / keep_share
+        safety = 1.0 - breakeven / block
+
+        prices[:, lo:lo + chunk] = block
+        contribution[:, lo:lo + chunk] = contrib
+        sums["price"] += block.sum(axis=1)
+        sums["contribution"] += contrib.sum(axis=1)
+        sums["margin_pct"] += (contrib / block).sum(axis=1)
+        sums["breakeven"] += breakeven.sum(axis=1)
+        sums["safety"] += safety.sum(axis=1)
+        np.minimum(min_safety, safety.min(axis=1), out=min_safety)
+
+    summary = scenarios.copy()
+    for k, total in sums.items():
+        summary[f"mean_{k}"] = total / n if n else np.nan
+    summary["min_safety"] = min_safety if n else np.nan
+    summary["total_contribution"] = sums["contribution"]
+    return {"scenarios": summary.round(4), "price": prices, "contribution": contribution}
+
+
+def write_sweep(result: Dict, skus: Sequence[str], out_dir: str, matrices: bool = True) -> None:
+    """
+    scenario_summary.csv, plus the price and contribution matrices as one
+    float32 column per scenario (parquet, or .npz without pyarrow).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    result["scenarios"].to_csv(os.path.join(out_dir, "scenario_summary.csv"), index_label="scenario")
+    if not matrices:
+        return
+    names = list(result["scenarios"].index)
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        np.savez(os.path.join(out_dir, "scenario_matrices.npz"), sku=np.asarray(skus, dtype=str),
+                 scenario=np.asarray(names), price=result["price"], contribution=result["contribution"])
+        return
+    for key in ("price", "contribution"):
+        table = pa.table({"sku": pa.array(skus, pa.string()),
+                          **{name: result[key][i] for i, name in enumerate(names)}})
+        pq.write_table(table, os.path.join(out_dir, f"scenario_{key}.parquet"))
+
+
+def _floats(text: str):
+    return [float(v) for v in text.split(",") if v.strip()]
+
+
+if __name__ == "__main__":
+    import time
+    from src.catalog import load_catalog
+    from src.shipping import worst_case_shipping
+
+    parser = argparse.ArgumentParser(description="Price every catalog SKU under a grid of pricing scenarios")
+    parser.add_argument("--catalog", required=True, help="Path to supplier CSV")
+    parser.add_argument("--out", required=True, help="Output directory")
+    for param, default in DEFAULT_PRICING.items():
+        parser.add_argument(f"--{param.replace('_', '-')}", type=_floats, default=[default],
+                            help=f"Comma-separated values (default {default})")
+    parser.add_argument("--summary-only", action="store_true", help="Skip the per-SKU matrices")
+    args = parser.parse_args()
+
+    catalog = load_catalog(args.catalog, node="scenarios")
+    cost_basis = (catalog['cost_price'] + worst_case_shipping(catalog).round(2)).round(2).to_numpy()
+    scenarios = scenario_grid(**{p: getattr(args, p) for p in PARAMS})
+
+    start = time.perf_counter()
+    result = sweep(cost_basis, scenarios)
+    print(f"Priced {len(cost_basis)} SKUs x {len(scenarios)} scenarios in {time.perf_counter() - start:.2f}s")
+    write_sweep(result, catalog['supplier_sku'].astype(str).tolist(), args.out, matrices=not args.summary_only)
+    print(result["scenarios"].to_string())
@@ -0,0 +1,99 @@
+import os
+import time
+import cProfile
+import functools
+import tracemalloc
+from typing import Dict, List
+
+# Top allocation sites kept per node
+TOP_ALLOCATIONS = 5
+
+_results: List[Dict] = []
+
+
+def _with_timing(update, name: str, seconds: float):
+    update = dict(update or {})
+    update['node_timings'] = [{"node": name, "seconds": round(seconds, 4)}]
+    return update
+
+
+def profile_node(name: str, fn, summary: bool = True):
+    """
+    Wrap a graph node so its wall time is added to `node_timings`. When the
+    run has `profile` set it also records cProfile stats, tracemalloc
+    peak/top allocations and wall vs CPU time. Wall time minus CPU time is
+    time spent waiting, mostly on the LLM and network. cProfile only sees the
+    node's own thread. Results go to `profile_dir` when the state has one;
+    worker processes pass summary=False and hand theirs over with
+    take_results().
+    """
+    @functools.wraps(fn)
+    def wrapper(state):
+        if not state.get('profile'):
+            start = time.perf_counter()
+            update = fn(state)
+            return _with_timing(update, name, time.perf_counter() - start)
+
+        profile_dir = state.get('profile_dir') or os.path.join(state['output_dir'], "profile")
+        os.makedirs(profile_dir, exist_ok=True)
+
+        tracemalloc.start()
+        profiler = cProfile.Profile()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        profiler.enable()
+        try:
+            update = fn(state)
+            return _with_timing(update, name, time.perf_counter() - wall_start)
+        finally:
+            profiler.disable()
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            _, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics("lineno")[:TOP_ALLOCATIONS]
+            tracemalloc.stop()
+
+            profiler.dump_stats(os.path.join(profile_dir, f"{name}.pstats"))
+            _results.append({
+                "node": name,
+                "wall_s": wall,
+                "cpu_s": cpu,
+                "wait_s": max(wall - cpu, 0.0),
+                "peak_mb": peak / 2 ** 20,
+                "top_allocations": [(str(s.traceback[0]), s.size / 2 ** 20) for s in top],
+            })
+            if summary:
+                write_summary(profile_dir)
+
+    return wrapper
+
+
+def take_results() -> List[Dict]:
+    """Results recorded in this process so far; they are removed from it."""
+    results = list(_results)
+    _results.clear()
+    return results
+
+
+def add_results(results: List[Dict], profile_dir: str):
+    """Add results taken from a worker process and rewrite the summary."""
+    _results.extend(results)
+    write_summary(profile_dir)
+
+
+def write_summary(profile_dir: str):
+    lines = [
+        "# Profile Summary",
+        "",
+        "| Node | Wall (s) | CPU (s) | Wait (s) | Peak mem (MB) |",
+        "|---|---|---|---|---|",
+    ]
+    for r in _results:
+        lines.append(f"| {r['node']} | {r['wall_s']:.3f} | {r['cpu_s']:.3f} | {r['wait_s']:.3f} | {r['peak_mb']:.2f} |")
+    lines += ["", "## Top Allocations", ""]
+    for r in _results:
+        lines.append(f"### {r['node']}")
+        lines += [f"- {site}: {mb:.3f} MB" for site, mb in r['top_allocations']]
+        lines.append("")
+    lines.append("Inspect call stacks with `python -m pstats <node>.pstats`.")
+    with open(os.path.join(profile_dir, "profile_summary.md"), "w") as f:
+        f.write("\n".join(lines) + "\n")
@@ -0,0 +1,224 @@
+import json
+from collections import Counter
+from datetime import date
+from typing import Dict, List
+
+import pandas as pd
+
+# Sourcing only considers SKUs at or above this stock level
+LOW_STOCK_THRESHOLD = 10
+
+# Keyword -> redline category. First match wins.
+REDLINE_CATEGORIES = [
+    ("grammar", "Grammar"),
+    ("spelling", "Grammar"),
+    ("over-promis", "Over-promising"),
+    ("claim", "Over-promising"),
+    ("seo", "SEO"),
+    ("length", "SEO"),
+]
+
+
+def classify_issue(issue: str) -> str:
+    text = str(issue).lower()
+    for keyword, category in REDLINE_CATEGORIES:
+        if keyword in text:
+            return category
+    return "Other"
+
+
+def _distribution(values: pd.Series) -> Dict:
+    if values.empty:
+        return {}
+    return {
+        "min": round(float(values.min()), 4),
+        "p25": round(float(values.quantile(0.25)), 4),
+        "median": round(float(values.median()), 4),
+        "p75": round(float(values.quantile(0.75)), 4),
+        "max": round(float(values.max()), 4),
+        "mean": round(float(values.mean()), 4),
+    }
+
+
+def stock_summary(stock: pd.Series) -> Dict:
+    """Catalog stock counts the report needs, so the catalog itself stays out of the graph state."""
+    return {
+        "catalog_size": int(len(stock)),
+        "out_of_stock": int((stock <= 0).sum()),
+        "low_stock": int((stock < LOW_STOCK_THRESHOLD).sum()),
+    }
+
+
+def compute_report_stats(state: Dict) -> Dict:
+    """
+    Deterministic run statistics. Everything the reports need is derived here
+    so the LLM only ever sees a compact, fixed-size digest.
+    """
+    actions = state.get('order_actions', [])
+    action_counts = Counter(a['action'] for a in actions)
+    orders_processed = len(actions)
+
+    prices = pd.DataFrame(state.get('price_updates', []))
+    if prices.empty:
+        margins = pd.Series(dtype=float)
+    else:
+        margins = (prices['new_price'] - prices['cost_basis']) / prices['new_price']
+
+    stock = state.get('catalog_stock') or {}
+    catalog_size = stock.get('catalog_size', 0)
+    out_of_stock = stock.get('out_of_stock', 0)
+    low_stock = stock.get('low_stock', 0)
+
+    redlines = state.get('listing_redlines', [])
+    redline_categories = Counter(
+        classify_issue(issue) for r in redlines for issue in r.get('issues', [])
+    )
+
+    return {
+        "run_date": state.get('run_date') or date.today().isoformat(),
+        "skus_sourced": len(state.get('selected_skus', [])),
+        "listings_generated": len(state.get('listings', [])),
+        "qa_rejections": len(redlines),
+        "orders_processed": orders_processed,
+        "action_breakdown": dict(action_counts.most_common()),
+        "gross_margin": _distribution(margins),
+        "catalog_size": catalog_size,
+        "out_of_stock_rate": round(out_of_stock / catalog_size, 4) if catalog_size else 0.0,
+        "low_stock_rate": round(low_stock / catalog_size, 4) if catalog_size else 0.0,
+        "backorder_rate": round(action_counts.get("BACKORDER", 0) / orders_processed, 4) if orders_processed else 0.0,
+        "redline_categories": dict(redline_categories.most_common()),
+        "redlined_skus": sorted(r['sku'] for r in redlines if 'sku' in r),
+        "degradations": list(state.get('degradations', [])),
+        "llm_output": _llm_output(state.get('llm_output', [])),
+        "dropped_skus": sorted({sku for u in state.get('llm_output', []) for sku in u.get('dropped_skus', [])}),
+        "week_over_week": {},
+    }
+
+
+def _llm_output(entries: List[Dict]) -> Dict:
+    """Calls, repaired responses and wasted calls per node (summed over shards)."""
+    totals = {}
+    for e in entries:
+        node = totals.setdefault(e['node'], {"calls": 0, "repaired": 0, "wasted": 0, "dropped": 0})
+        for k in ("calls", "repaired", "wasted"):
+            node[k] += e.get(k, 0)
+        node["dropped"] += len(e.get('dropped_skus', []))
+    return totals
+
+
+def build_digest(stats: Dict) -> str:
+    """Compact JSON digest for the summary prompt. Size does not grow with SKU count."""
+    digest = {k: v for k, v in stats.items() if k not in ("redlined_skus", "dropped_skus")}
+    digest["redlined_sku_count"] = len(stats.get("redlined_skus", []))
+    digest["dropped_sku_count"] = len(stats.get("dropped_skus", []))
+    digest["week_over_week"] = {k: v["change"] for k, v in stats.get("week_over_week", {}).items()}
+    digest["degradations"] = [{k: d[k] for k in ("node", "mode", "count")} for d in stats.get("degradations", [])]
+    return json.dumps(digest, separators=(",", ":"))
+
+
+def fallback_summary(stats: Dict) -> Dict:
+    """Rule-based summary used when the LLM call is disabled or fails."""
+    summary = (
+        f"Sourced {stats['skus_sourced']} SKUs, generated {stats['listings_generated']} listings "
+        f"({stats['qa_rejections']} rejected by QA) and processed {stats['orders_processed']} orders."
+    )
+    recommendations = []
+    if stats['qa_rejections']:
+        top = next(iter(stats['redline_categories']), "Other")
+        recommendations.append(f"Review the {stats['qa_rejections']} redlined listings; most issues are {top}.")
+    if stats['backorder_rate'] > 0:
+        recommendations.append(f"Backorder rate is {stats['backorder_rate']:.0%}; check supplier stock for affected SKUs.")
+    for d in stats['degradations']:
+        if d['mode'] == "deferred to next run":
+            recommendations.append(f"{d['count']} listings were deferred to the next run by the deadline.")
+    wasted = sum(n['wasted'] for n in stats.get('llm_output', {}).values())
+    if stats.get('dropped_skus'):
+        recommendations.append(f"{len(stats['dropped_skus'])} SKUs got no usable LLM output ({wasted} wasted calls); "
+                               "check llm_routing.json for failing backends.")
+    if stats['low_stock_rate'] > 0.5:
+        recommendations.append(f"{stats['low_stock_rate']:.0%} of the catalog is below the sourcing stock threshold.")
+    if not recommendations:
+        recommendations.append("No action required.")
+    return {"executive_summary": summary, "recommendations": recommendations}
+
+
+def _table(rows: List[tuple], headers: tuple) -> str:
+    lines = ["| " + " | ".join(headers) + " |", "|" + "---|" * len(headers)]
+    lines += ["| " + " | ".join(str(c) for c in row) + " |" for row in rows]
+    return "\n".join(lines)
+
+
+def _pct(value: float) -> str:
+    return f"{value:.1%}"
+
+
+def _fmt(value) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    return str(value)
+
+
+def _week_over_week_table(wow: Dict) -> str:
+    if not wow:
+        return "No run history available."
+    return _table([(k, _fmt(v["this_week"]), _fmt(v["last_week"]), _fmt(v["change"])) for k, v in wow.items()],
+                  ("Metric", "This week", "Last week", "Change"))
+
+
+def render_daily_report(stats: Dict, summary: Dict) -> str:
+    margin = stats['gross_margin']
+    sections = [
+        f"# Daily Operations Report - {stats['run_date']}",
+        "## Executive Summary",
+        summary['executive_summary'],
+        "## Key Statistics",
+        _table([
+            ("SKUs Sourced", stats['skus_sourced']),
+            ("Listings Generated", stats['listings_generated']),
+            ("QA Rejections", stats['qa_rejections']),
+            ("Orders Processed", stats['orders_processed']),
+        ], ("Metric", "Value")),
+        "## Order Actions",
+        _table(list(stats['action_breakdown'].items()) or [("-", 0)], ("Action", "Orders")),
+        "## Gross Margin Distribution",
+        _table([(k, _pct(v)) for k, v in margin.items()] or [("-", "-")], ("Statistic", "Margin")),
+        "## Stock",
+        _table([
+            ("Catalog SKUs", stats['catalog_size']),
+            ("Out of stock", _pct(stats['out_of_stock_rate'])),
+            (f"Below {LOW_STOCK_THRESHOLD} units", _pct(stats['low_stock_rate'])),
+            ("Orders backordered", _pct(stats['backorder_rate'])),
+        ], ("Metric", "Value")),
+        "## Listing Issues",
+        _table(list(stats['redline_categories'].items()) or [("-", 0)], ("Category", "Issues")),
+        "Redlined SKUs: " + (", ".join(stats['redlined_skus']) or "none"),
+        "## Week over Week",
+        _week_over_week_table(stats['week_over_week']),
+        "## Degraded Steps",
+        _table([(d['node'], d['mode'], d['count']) for d in stats['degradations']] or [("-", "none", 0)],
+               ("Node", "Degradation", "Items")),
+        "## LLM Output",
+        _table([(node, n['calls'], n['repaired'], n['wasted'], n['dropped']) for node, n in stats['llm_output'].items()]
+               or [("-", 0, 0, 0, 0)], ("Node", "Calls", "Repaired", "Wasted", "Dropped SKUs")),
+        "Dropped SKUs: " + (", ".join(stats['dropped_skus']) or "none"),
+        "## Action Items",
+        "\n".join(f"- {r}" for r in summary['recommendations']),
+    ]
+    return "\n\n".join(sections) + "\n"
+
+
+def render_manager_report(stats: Dict, summary: Dict) -> str:
+    sections = [
+        "# Manager Recommendations",
+        summary['executive_summary'],
+        "## Recommendations",
+        "\n".join(f"{i}. {r}" for i, r in enumerate(summary['recommendations'], 1)),
+        "## Snapshot",
+        f"- SKUs selected: {stats['skus_sourced']}\n"
+        f"- Listings: {stats['listings_generated']}\n"
+        f"- QA failures: {stats['qa_rejections']}\n"
+        f"- Orders processed: {stats['orders_processed']}",
+    ]
+    return "\n\n".join(sections) + "\n"
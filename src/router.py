@@ -0,0 +1,268 @@
+import time
+import threading
+from collections import deque, defaultdict
+from typing import Any, Dict, Optional
+
+import numpy as np
+from langchain_core.runnables import Runnable
+
+from src.deadline import DeadlineExceeded
+from src.structured import StructuredLLM
+
+# Minimum observations before a backend can be judged unhealthy
+MIN_SAMPLES = 5
+
+
+class BackendStats:
+    """Sliding window of call outcomes for one backend."""
+
+    def __init__(self, window: int):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.tokens = 0
+        self.unhealthy_since: Optional[float] = None
+
+    def record(self, latency_s: float, ok: bool, tokens: int = 0):
+        self.calls += 1
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(latency_s)
+            self.tokens += tokens
+        else:
+            self.errors += 1
+
+    def raw(self) -> Dict:
+        return {"latencies": list(self.latencies), "outcomes": list(self.outcomes),
+                "calls": self.calls, "errors": self.errors, "tokens": self.tokens}
+
+    def merge(self, raw: Dict):
+        self.latencies.extend(raw["latencies"])
+        self.outcomes.extend(raw["outcomes"])
+        self.calls += raw["calls"]
+        self.errors += raw["errors"]
+        self.tokens += raw["tokens"]
+
+    def p95_ms(self) -> float:
+        if not self.latencies:
+            return 0.0
+        return float(np.percentile(self.latencies, 95)) * 1000
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+
+
+class ModelRouter:
+    """
+    Picks a backend per role and per request from the routing table. A role's
+    primary backend is skipped in favour of its fallback while its observed
+    p95 latency or error rate is above the role's targets; after `cooldown_s`
+    the primary gets a probe request again. Backends over the role's cost
+    target (`max_cost_per_1k`, or any paid backend once the role's spend
+    reaches `budget_usd`) are not tried unless nothing else is left.
+    Spend is tracked per process.
+    """
+
+    def __init__(self, backends: Dict[str, Dict], routes: Dict[str, Dict], window: int = 50, cooldown_s: float = 60.0):
+        self.backends = backends
+        self.routes = routes
+        self.cooldown_s = cooldown_s
+        self.stats = defaultdict(lambda: BackendStats(window))
+        self.decisions = defaultdict(lambda: defaultdict(int))
+        self.failovers = defaultdict(int)
+        self.rerouted = defaultdict(int)
+        self.cost_rerouted = defaultdict(int)
+        self.spend = defaultdict(float)
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def route(self, role: str) -> Dict:
+        return self.routes.get(role, self.routes["default"])
+
+    def _healthy(self, backend: str, route: Dict) -> bool:
+        stats = self.stats[backend]
+        if len(stats.outcomes) < MIN_SAMPLES:
+            return True
+        ok = stats.p95_ms() <= route["p95_ms"] and stats.error_rate() <= route["max_error_rate"]
+        now = time.monotonic()
+        if ok:
+            stats.unhealthy_since = None
+            return True
+        if stats.unhealthy_since is None:
+            stats.unhealthy_since = now
+            return False
+        if now - stats.unhealthy_since >= self.cooldown_s:
+            # Let one request through to see whether the backend recovered
+            stats.unhealthy_since = now
+            return True
+        return False
+
+    def _cost(self, backend: str) -> float:
+        return self.backends[backend].get("cost_per_1k_tokens", 0.0)
+
+    def _affordable(self, role: str, backend: str, route: Dict) -> bool:
+        cost = self._cost(backend)
+        if route.get("max_cost_per_1k") is not None and cost > route["max_cost_per_1k"]:
+            return False
+        if route.get("budget_usd") is not None and cost > 0 and self.spend[role] >= route["budget_usd"]:
+            return False
+        return True
+
+    def choose(self, role: str) -> list:
+        """Backends to try for this request, in order."""
+        route = self.route(role)
+        order = [route["primary"]] + ([route["fallback"]] if route.get("fallback") else [])
+        with self._lock:
+            if len(order) > 1 and not self._healthy(order[0], route):
+                order.reverse()
+                self.rerouted[role] += 1
+            # Over the cost target everywhere: the cheapest backend still serves
+            affordable = [b for b in order if self._affordable(role, b, route)] or [min(order, key=self._cost)]
+            if affordable[0] != order[0]:
+                self.cost_rerouted[role] += 1
+        return affordable
+
+    def client(self, backend: str, temperature: float):
+        key = (backend, temperature)
+        if key not in self._clients:
+            spec = self.backends[backend]
+            self._clients[key] = spec["factory"](spec["model"], temperature)
+        return self._clients[key]
+
+    def record(self, role: str, backend: str, latency_s: float, ok: bool, tokens: int = 0):
+        with self._lock:
+            self.stats[backend].record(latency_s, ok, tokens)
+            if ok:
+                self.decisions[role][backend] += 1
+                self.spend[role] += tokens / 1000 * self._cost(backend)
+
+    def drain(self) -> Dict:
+        """Raw stats recorded so far, then reset. Worker processes hand these to the parent's router."""
+        with self._lock:
+            raw = {
+                "backends": {name: stats.raw() for name, stats in self.stats.items()},
+                "decisions": {role: dict(counts) for role, counts in self.decisions.items()},
+                "failovers": dict(self.failovers),
+                "rerouted": dict(self.rerouted),
+                "cost_rerouted": dict(self.cost_rerouted),
+                "spend": dict(self.spend),
+            }
+            for counter in (self.stats, self.decisions, self.failovers, self.rerouted, self.cost_rerouted, self.spend):
+                counter.clear()
+        return raw
+
+    def merge(self, raw: Dict):
+        """Add stats drained from another process's router."""
+        with self._lock:
+            for name, stats in raw["backends"].items():
+                self.stats[name].merge(stats)
+            for role, counts in raw["decisions"].items():
+                for backend, n in counts.items():
+                    self.decisions[role][backend] += n
+            for key in ("failovers", "rerouted", "cost_rerouted", "spend"):
+                for role, n in raw[key].items():
+                    getattr(self, key)[role] += n
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            backends = {}
+            for name, stats in self.stats.items():
+                cost = self._cost(name)
+                backends[name] = {
+                    "calls": stats.calls,
+                    "errors": stats.errors,
+                    "error_rate": round(stats.error_rate(), 4),
+                    "p95_ms": round(stats.p95_ms(), 1),
+                    "tokens": stats.tokens,
+                    "est_cost": round(stats.tokens / 1000 * cost, 6),
+                }
+            return {
+                "routes": {role: dict(counts) for role, counts in self.decisions.items()},
+                "failovers": dict(self.failovers),
+                "rerouted": dict(self.rerouted),
+                "cost_rerouted": dict(self.cost_rerouted),
+                "spend_usd": {role: round(usd, 6) for role, usd in self.spend.items()},
+                "backends": backends,
+            }
+
+
+def _invoke(llm, input: Any, config, timeout: Optional[float], **kwargs):
+    """llm.invoke() given at most `timeout` seconds; a call that runs over is abandoned, not cancelled."""
+    if timeout is None:
+        return llm.invoke(input, config, **kwargs)
+    result = {}
+
+    def run():
+        try:
+            result["value"] = llm.invoke(input, config, **kwargs)
+        except Exception as e:
+            result["error"] = e
+
+    worker = threading.Thread(target=run, name="llm-call", daemon=True)
+    worker.start()
+    worker.join(timeout)
+    if worker.is_alive():
+        raise DeadlineExceeded(f"No response within {timeout:.1f}s")
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
+
+
+class RoutedLLM(Runnable):
+    """
+    Chat model stand-in that delegates each call to the backend chosen by the
+    router. With a `deadline` each backend call gets the time left until it;
+    running out raises DeadlineExceeded instead of failing over.
+    """
+
+    def __init__(self, router: ModelRouter, role: str, deadline: Optional[float] = None):
+        self.router = router
+        self.role = role
+        self.deadline = deadline
+
+    def invoke(self, input: Any, config=None, **kwargs):
+        return self._call(input, config, None, **kwargs)
+
+    def invoke_structured(self, input: Any, schema, config=None, **kwargs):
+        """
+        Like invoke, but backends flagged `structured_output` are asked for
+        `schema` directly and return {"raw", "parsed", "parsing_error"};
+        the others return their plain message.
+        """
+        return self._call(input, config, schema, **kwargs)
+
+    def with_structured_output(self, schema, retries: int = 1, usage: Optional[Dict] = None):
+        return StructuredLLM(self, schema, retries, usage)
+
+    def _call(self, input: Any, config, schema, **kwargs):
+        route = self.router.route(self.role)
+        last_error = None
+        for attempt, backend in enumerate(self.router.choose(self.role)):
+            if attempt:
+                with self.router._lock:
+                    self.router.failovers[self.role] += 1
+            llm = self.router.client(backend, route["temperature"])
+            native = schema is not None and self.router.backends[backend].get("structured_output", False)
+            if native:
+                llm = llm.with_structured_output(schema, include_raw=True)
+            timeout = None if self.deadline is None else self.deadline - time.time()
+            if timeout is not None and timeout <= 0:
+                raise DeadlineExceeded(f"Deadline passed before calling {backend} for role {self.role}")
+            start = time.perf_counter()
+            try:
+                res = _invoke(llm, input, config, timeout, **kwargs)
+            except DeadlineExceeded:
+                self.router.record(self.role, backend, time.perf_counter() - start, False)
+                raise
+            except Exception as e:
+                self.router.record(self.role, backend, time.perf_counter() - start, False)
+                print(f"LLM backend {backend} failed for role {self.role}: {e}")
+                last_error = e
+                continue
+            usage = getattr(res["raw"] if native else res, "usage_metadata", None) or {}
+            self.router.record(self.role, backend, time.perf_counter() - start, True, usage.get("total_tokens", 0))
+            return res
+        raise last_error
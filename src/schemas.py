@@ -0,0 +1,24 @@
+from typing import List, Literal
+
+from pydantic import BaseModel, Field, field_validator
+
+
+class Listing(BaseModel):
+    """Storefront copy for one product, or one locale variant of it."""
+    title: str
+    description_html: str
+    bullets: List[str]
+    tags: List[str]
+    seo_title: str
+    seo_description: str
+
+
+class QAVerdict(BaseModel):
+    """Reviewer verdict for one listing."""
+    status: Literal["PASS", "FAIL"]
+    issues: List[str] = Field(default_factory=list)
+
+    @field_validator("status", mode="before")
+    @classmethod
+    def _upper(cls, value):
+        return value.strip().upper() if isinstance(value, str) else value
@@ -0,0 +1,196 @@
+"""
+Sharded execution for very large catalogs.
+
+The catalog and orders are partitioned by a hash of the product (the
+supplier SKU for single-supplier catalogs) into N shards.
+Per-SKU work runs in worker processes using the regular agents; each
+worker reads its own slice of the parsed catalog cache, and only the
+pending orders are written out per shard. Global steps (top-k selection,
+storefront sync and reports) run in a reduce phase in the parent process.
+
+    map:    shard -> local top-k candidates + order routing
+    reduce: global top-k, price/stock updates
+    map:    selected SKUs of each shard -> listing + QA
+    reduce: merge artifacts in global order, sync, reports
+"""
+import os
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+import pandas as pd
+
+from src import order_store, profiling
+from src.config import ROUTER
+from src.profiling import profile_node
+from src.catalog import load_catalog, product_ids, shard_ids
+from src.agents.inventory import feed_agent, sourcing_agent, pricing_agent, storefront_sync_agent, select_top_skus, TOP_K
+from src.agents.content import listing_agent, qa_agent, listing_qa_pipeline_agent, _write_listings
+from src.agents.ops import order_routing_agent, reporter_agent, manager_agent
+
+# State keys the graph merges with operator.add instead of replacing
+APPENDED_KEYS = ("degradations", "llm_output", "node_timings")
+
+
+def partition(catalog_path: str, orders: pd.DataFrame, n: int, work_dir: str) -> List[Dict]:
+    """
+    Shard by product so all supplier offers of a product (and its orders)
+    land in the same shard; single-supplier catalogs use the supplier SKU.
+    Workers load their catalog rows with load_catalog(shard=...), so only
+    the orders are split here.
+    """
+    catalog = load_catalog(catalog_path, columns=["supplier_sku", "product_id"])
+    catalog = catalog[catalog['supplier_sku'].isin(orders['sku'])]
+    product_of = dict(zip(catalog['supplier_sku'], product_ids(catalog)))
+    orders_shard = shard_ids(orders['sku'].map(lambda s: product_of.get(s, s)), n)
+
+    shards = []
+    for i in range(n):
+        shard_dir = os.path.join(work_dir, f"shard_{i:03d}")
+        os.makedirs(shard_dir, exist_ok=True)
+        shard = {
+            "shard": i,
+            "catalog_shard": (i, n),
+            "orders_path": os.path.join(shard_dir, "orders.csv"),
+            "output_dir": shard_dir,
+        }
+        orders[orders_shard == i].to_csv(shard["orders_path"], index=False)
+        shards.append(shard)
+    return shards
+
+
+def _worker_node(state: Dict, name: str, fn):
+    """Agent wrapped like a graph node; profile results are collected by the parent."""
+    return profile_node(f"shard_{state['shard']:03d}.{name}", fn, summary=False)
+
+
+def _worker_stats() -> Dict:
+    """Router stats and profile results of this worker, for the parent to merge."""
+    return {"routing": ROUTER.drain(), "profile": profiling.take_results()}
+
+
+def _init_worker():
+    # Forked workers start with a copy of the parent's stats; drop them
+    _worker_stats()
+
+
+def _merge_worker_stats(state: Dict, results: List[Dict]):
+    for r in results:
+        ROUTER.merge(r['routing'])
+        if state.get('profile'):
+            profiling.add_results(r['profile'], state['profile_dir'])
+
+
+def _map_candidates(state: Dict) -> Dict:
+    """Local top-k of one shard (the global top-k is a subset of the union) and its orders."""
+    state = dict(state, degradations=[], node_timings=[])
+    _apply(state, _worker_node(state, "sourcing", sourcing_agent)(state))
+    _apply(state, _worker_node(state, "routing", order_routing_agent)(state))
+    return {
+        "candidates": state['selected_skus'],
+        "order_actions": state['order_actions'],
+        "degradations": state['degradations'],
+        "catalog_stock": state['catalog_stock'],
+        **_worker_stats(),
+    }
+
+
+def _map_listings(state: Dict) -> Dict:
+    state = dict(state, degradations=[], llm_output=[], node_timings=[])
+    if state['selected_skus']:
+        if state.get('pipeline_listing_qa'):
+            _apply(state, _worker_node(state, "listing_qa", listing_qa_pipeline_agent)(state))
+        else:
+            _apply(state, _worker_node(state, "listing", listing_agent)(state))
+            _apply(state, _worker_node(state, "qa", qa_agent)(state))
+    return {
+        "listings": state.get('listings', []),
+        "listing_redlines": state.get('listing_redlines', []),
+        "degradations": state['degradations'],
+        "llm_output": state['llm_output'],
+        **_worker_stats(),
+    }
+
+
+def _apply(state: Dict, update: Dict):
+    """state.update() that appends the list keys like the graph's reducer does."""
+    update = dict(update)
+    for key in APPENDED_KEYS:
+        state[key] = state.get(key, []) + update.pop(key, [])
+    state.update(update)
+
+
+def _order_by(records: List[Dict], key: str, order: List[str]) -> List[Dict]:
+    rank = {k: i for i, k in enumerate(order)}
+    return sorted(records, key=lambda r: rank.get(r[key], len(rank)))
+
+
+def run_sharded(initial_state: Dict, n: int) -> Dict:
+    state = dict(initial_state, profile_dir=os.path.join(initial_state['output_dir'], "profile"))
+    _apply(state, profile_node("feed", feed_agent)(state))
+    work_dir = os.path.join(state['output_dir'], "shards")
+
+    # New orders are picked here once; shards route everything they are given
+    store = order_store.connect(state['orders_db']) if state.get('orders_db') else None
+    if store:
+        orders, watermark = order_store.pending_orders(store, state['orders_path'])
+    else:
+        orders = pd.read_csv(state['orders_path'])
+    shards = partition(state['catalog_path'], orders, n, work_dir)
+    base = {k: v for k, v in state.items() if k not in ("orders_path", "output_dir", "orders_db")}
+    shard_states = [{**base, **shard} for shard in shards]
+
+    def timed(name, start):
+        state['node_timings'] = state.get('node_timings', []) + [
+            {"node": name, "seconds": round(time.perf_counter() - start, 4)}]
+
+    with ProcessPoolExecutor(max_workers=n, initializer=_init_worker) as pool:
+        print(f"--- Map: sourcing + routing over {n} shards ---")
+        start = time.perf_counter()
+        mapped = list(pool.map(_map_candidates, shard_states))
+        timed("map_sourcing_routing", start)
+        _merge_worker_stats(state, mapped)
+
+        print("--- Reduce: global top-k selection ---")
+        start = time.perf_counter()
+        candidates = pd.DataFrame([c for m in mapped for c in m['candidates']])
+        selected = select_top_skus(candidates, TOP_K).to_dict(orient='records') if len(candidates) else []
+        state['selected_skus'] = selected
+        state['catalog_stock'] = {k: sum(m['catalog_stock'][k] for m in mapped) for k in mapped[0]['catalog_stock']}
+        with open(os.path.join(state['output_dir'], "selection.json"), "w") as f:
+            json.dump(selected, f, indent=2)
+        timed("reduce_select", start)
+        _apply(state, profile_node("pricing", pricing_agent)(state))
+        _apply(state, profile_node("storefront_sync", storefront_sync_agent)(state))
+
+        selected_skus = [s['supplier_sku'] for s in selected]
+        owner = shard_ids(pd.Series([s.get('product_id') or s['supplier_sku'] for s in selected], dtype=object), n).tolist()
+        for shard_state in shard_states:
+            shard_state['selected_skus'] = [s for s, o in zip(selected, owner) if o == shard_state['shard']]
+
+        print(f"--- Map: listing + QA over {n} shards ---")
+        start = time.perf_counter()
+        listed = list(pool.map(_map_listings, shard_states))
+        timed("map_listing_qa", start)
+        _merge_worker_stats(state, listed)
+
+    print("--- Reduce: merge shard artifacts ---")
+    state['listings'] = _order_by([l for m in listed for l in m['listings']], 'sku', selected_skus)
+    state['listing_redlines'] = _order_by([r for m in listed for r in m['listing_redlines']], 'sku', selected_skus)
+    state['order_actions'] = _order_by([a for m in mapped for a in m['order_actions']], 'order_id',
+                                       orders['order_id'].tolist())
+    state['degradations'] += [d for m in mapped + listed for d in m['degradations']]
+    state['llm_output'] = state.get('llm_output', []) + [u for m in listed for u in m['llm_output']]
+
+    _write_listings(state, state['listings'])
+    for name, key in (("listing_redlines.json", "listing_redlines"), ("order_actions.json", "order_actions")):
+        with open(os.path.join(state['output_dir'], name), "w") as f:
+            json.dump(state[key], f, indent=2)
+    if store:
+        order_store.mark_processed(store, state['order_actions'], state['run_id'], watermark, orders)
+        store.close()
+
+    for name, node in (("reporting", reporter_agent), ("manager", manager_agent)):
+        _apply(state, profile_node(name, node)(state))
+    return state
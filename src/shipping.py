@@ -0,0 +1,69 @@
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Courier volumetric divisor (cm^3 per kg)
+DIM_DIVISOR = 5000.0
+
+# Rate cards share the same weight bands (upper bound in kg, inclusive).
+# Above the last band each extra kg (rounded up) costs EXTRA_PER_KG.
+BAND_EDGES = np.array([0.5, 1.0, 2.0, 5.0, 10.0, 20.0])
+RATE_CARDS = {
+    "US": {"bands": [4.50, 6.00, 8.50, 13.00, 20.00, 32.00], "extra_per_kg": 1.50},
+    "AU": {"bands": [6.00, 8.00, 11.00, 17.00, 26.00, 40.00], "extra_per_kg": 2.00},
+    "UK": {"bands": [5.00, 7.00, 9.50, 15.00, 23.00, 36.00], "extra_per_kg": 1.80},
+}
+COUNTRIES = list(RATE_CARDS)
+
+# Precomputed (country x band) price table and per-country overflow rate
+_BAND_PRICES = np.array([RATE_CARDS[c]["bands"] for c in COUNTRIES])
+_EXTRA_PER_KG = np.array([RATE_CARDS[c]["extra_per_kg"] for c in COUNTRIES])
+DIM_COLUMNS = ["length_cm", "width_cm", "height_cm"]
+
+
+def chargeable_weight(df: pd.DataFrame) -> np.ndarray:
+    """max(actual, volumetric) weight in kg; NaN where the weight is unknown."""
+    if "chargeable_kg" in df:
+        return df["chargeable_kg"].to_numpy(dtype=float)
+    actual = df["weight_kg"].to_numpy(dtype=float) if "weight_kg" in df else np.full(len(df), np.nan)
+    if all(c in df for c in DIM_COLUMNS):
+        volume = np.prod([df[c].to_numpy(dtype=float) for c in DIM_COLUMNS], axis=0)
+        return np.fmax(actual, volume / DIM_DIVISOR)
+    return actual
+
+
+def shipping_matrix(weights: np.ndarray, countries: Optional[Sequence[str]] = None) -> np.ndarray:
+    """
+    Shipping cost for every weight x destination in one pass.
+    Returns an array of shape (len(weights), len(countries)); NaN weights give NaN.
+    """
+    countries = list(countries or COUNTRIES)
+    rows = [COUNTRIES.index(c) for c in countries]
+    weights = np.asarray(weights, dtype=float)
+
+    band = np.searchsorted(BAND_EDGES, np.nan_to_num(weights), side="left")
+    capped = np.minimum(band, len(BAND_EDGES) - 1)
+    overflow_kg = np.ceil(np.maximum(np.nan_to_num(weights) - BAND_EDGES[-1], 0.0))
+
+    costs = _BAND_PRICES[rows][:, capped].T + overflow_kg[:, None] * _EXTRA_PER_KG[rows]
+    costs[np.isnan(weights)] = np.nan
+    return costs
+
+
+def shipping_costs(df: pd.DataFrame, countries: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """
+    Per-destination shipping for each catalog row, indexed like `df`.
+    Rows without weight data fall back to the catalog's flat shipping_cost.
+    """
+    countries = list(countries or COUNTRIES)
+    matrix = shipping_matrix(chargeable_weight(df), countries)
+    if "shipping_cost" in df:
+        flat = df["shipping_cost"].to_numpy(dtype=float)[:, None]
+        matrix = np.where(np.isnan(matrix), flat, matrix)
+    return pd.DataFrame(matrix, index=df.index, columns=countries)
+
+
+def worst_case_shipping(df: pd.DataFrame, countries: Optional[List[str]] = None) -> pd.Series:
+    """Highest shipping cost over the destinations, so one price keeps its margin everywhere."""
+    return shipping_costs(df, countries).max(axis=1)
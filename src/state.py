@@ -1,17 +1,44 @@
-from typing import List, Dict, TypedDict
+import operator
+from typing import Annotated, List, Dict, TypedDict
 
 class AgentState(TypedDict):
     """Global state passed between agents"""
-    catalog_path: str
+    catalog_path: str            # Local catalog CSV (the fetched copy when catalog_url is set)
+    catalog_url: str             # Supplier feed URL; empty when the catalog is a local file
     orders_path: str
     output_dir: str
+    llm_summary: bool            # Allow one LLM call for report summaries
+    profile: bool                # Record per-node CPU/memory profiles
+    run_started: float           # time.time() at start of run
+    run_id: str                  # Unique id of this run in the history store
+    run_date: str                # ISO date the run's facts are filed under
+    history_db: str              # SQLite run-history path; empty disables it
+    orders_db: str               # SQLite processed-orders store; empty routes every order
+    deadline: float              # time.time() by which the run must finish; 0 = none
+    dedupe_listings: bool        # Reuse listings across near-duplicate SKUs
+    pack_size: int               # Max products per listing prompt
+    locales: List[str]           # Markets to localize listings for; empty = single listing
+    pipeline_listing_qa: bool    # Run listing and QA concurrently per SKU
+    pipeline_depth: int          # Max listings waiting for QA
+    qa_regenerate: bool          # Regenerate QA failures once (pipeline mode)
+    storefront_url: str          # Bulk update endpoint; empty disables sync
+    sync_batch_size: int         # Items per bulk mutation
+    sync_workers: int            # Max bulk requests in flight
     
     # Data Flow
-    raw_catalog: List[Dict]
+    catalog_stock: Dict          # Catalog size and out-of/low-stock counts for the report
     selected_skus: List[Dict]    # Output of Sourcing Agent
     listings: List[Dict]         # Output of Listing Agent
     listing_redlines: List[Dict] # Output of QA Agent
     price_updates: List[Dict]    # Output of Pricing Agent
     stock_updates: List[Dict]    # Output of Pricing Agent
+    feed_result: Dict            # Output of Supplier Feed Agent
+    sync_result: Dict            # Output of Storefront Sync Agent
     order_actions: List[Dict]    # Output of Routing Agent
-    daily_report: str            # Output of Reporter Agent
\ No newline at end of file
+    daily_report: str            # Output of Reporter Agent
+    report_stats: Dict           # Output of Reporter Agent
+    report_summary: Dict         # Output of Reporter Agent
+    manager_report: str          # Output of Manager Agent
+    degradations: Annotated[List[Dict], operator.add]  # Steps degraded by the deadline
+    node_timings: Annotated[List[Dict], operator.add]  # Wall time per node
+    llm_output: Annotated[List[Dict], operator.add]    # LLM calls, repairs, wasted calls and dropped SKUs per node
\ No newline at end of file
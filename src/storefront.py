@@ -0,0 +1,107 @@
+import os
+import json
+import time
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def diff_updates(price_updates: List[Dict], stock_updates: List[Dict], synced: Dict[str, Dict]) -> List[Dict]:
+    """Merge price and stock updates per SKU and keep only what differs from the last synced state."""
+    current = {}
+    for p in price_updates:
+        current.setdefault(p['sku'], {})['price'] = float(p['new_price'])
+    for s in stock_updates:
+        current.setdefault(s['sku'], {})['stock'] = int(s['stock_level'])
+
+    changes = []
+    for sku, fields in current.items():
+        last = synced.get(sku, {})
+        changed = {k: v for k, v in fields.items() if last.get(k) != v}
+        if changed:
+            changes.append({"sku": sku, **changed})
+    return changes
+
+
+def load_sync_state(path: str) -> Dict[str, Dict]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_sync_state(path: str, state: Dict[str, Dict]):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def retry_delay(retry_after: Optional[str], default: float) -> float:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)."""
+    if not retry_after:
+        return default
+    try:
+        return max(float(retry_after), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+
+class StorefrontClient:
+    """Minimal client for the storefront bulk update endpoint."""
+
+    def __init__(self, base_url: str, token: str = "", timeout: float = 30.0, retries: int = 3, backoff: float = 0.5):
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+
+    def bulk_update(self, items: List[Dict]) -> Dict:
+        body = json.dumps({"items": items}).encode()
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["X-Shopify-Access-Token"] = self.token
+        for attempt in range(self.retries + 1):
+            req = urllib.request.Request(f"{self.base_url}/bulk_update", data=body, headers=headers, method="POST")
+            try:
+                with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                    return json.loads(resp.read())
+            except urllib.error.HTTPError as e:
+                if e.code not in RETRY_STATUS or attempt == self.retries:
+                    raise
+                delay = retry_delay(e.headers.get("Retry-After"), self.backoff * 2 ** attempt)
+            except (urllib.error.URLError, TimeoutError, ConnectionError):
+                # Bulk updates set absolute values, so resending after a read timeout is safe
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff * 2 ** attempt
+            time.sleep(delay)
+
+
+def sync_changes(client: StorefrontClient, changes: List[Dict], batch_size: int = 100, workers: int = 4):
+    """
+    Submit changes as bulk batches with at most `workers` requests in flight.
+    Returns (synced items, failed items).
+    """
+    batches = [changes[i:i + batch_size] for i in range(0, len(changes), batch_size)]
+    synced, failed = [], []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(client.bulk_update, batch): batch for batch in batches}
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                future.result()
+                synced.extend(batch)
+            except Exception as e:
+                print(f"Storefront batch of {len(batch)} failed: {e}")
+                failed.extend(batch)
+    return synced, failed
@@ -0,0 +1,174 @@
+"""
+Structured LLM output: typed results from provider-side structured output
+where the backend supports it, and from free text otherwise. Free text goes
+through a local repair pass before a response is given up on, since a
+retry costs a full LLM call.
+
+Each chain counts into a `usage` dict: calls made, responses that needed
+repair, and wasted calls whose output had to be thrown away.
+"""
+import re
+import ast
+import json
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+from langchain_core.exceptions import OutputParserException
+from langchain_core.runnables import Runnable, RunnableLambda
+
+FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+JSON_LITERALS = re.compile(r"\b(true|false|null)\b")
+
+
+def new_usage() -> Dict:
+    return {"calls": 0, "repaired": 0, "wasted": 0}
+
+
+def _in_string(text: str) -> Tuple[List[bool], bool]:
+    """Per character, whether it is part of a string literal (quotes included); and whether one is left open."""
+    mask, in_string, escaped = [], False, False
+    for ch in text:
+        if in_string:
+            mask.append(True)
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        else:
+            in_string = ch == '"'
+            mask.append(in_string)
+    return mask, in_string
+
+
+def _close_brackets(text: str) -> str:
+    """Cut anything after the outermost value and close what a truncated response left open."""
+    stack = []
+    mask, open_string = _in_string(text)
+    for i, ch in enumerate(text):
+        if mask[i]:
+            continue
+        if ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+            if not stack:
+                return text[:i + 1]
+    return text + ('"' if open_string else "") + "".join(reversed(stack))
+
+
+def _drop_trailing_commas(text: str) -> str:
+    """Remove commas directly before a closing bracket, leaving string contents alone."""
+    mask, _ = _in_string(text)
+    out = []
+    for i, ch in enumerate(text):
+        if ch == "," and not mask[i]:
+            j = i + 1
+            while j < len(text) and text[j].isspace():
+                j += 1
+            if j < len(text) and text[j] in "}]" and not mask[j]:
+                continue
+        out.append(ch)
+    return "".join(out)
+
+
+def repair_json(text: str) -> str:
+    """
+    Fix the usual defects of model-written JSON: code fences, prose around
+    the value, smart quotes, trailing commas, Python literals and output cut
+    off before the closing brackets.
+    """
+    fenced = FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    text = text.translate(SMART_QUOTES)
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if starts:
+        text = text[min(starts):]
+    text = _close_brackets(text)
+    text = _drop_trailing_commas(text)
+    return re.sub(r'\b(True|False|None)\b(?=(?:[^"]*"[^"]*")*[^"]*$)', lambda m: PY_LITERALS[m.group(1)], text)
+
+
+def parse_json(text: str) -> Tuple[Any, bool]:
+    """Parsed value and whether it needed repairing. Raises OutputParserException."""
+    text = str(text)
+    fenced = FENCE.search(text)
+    try:
+        # A fenced block is the normal way models wrap JSON, not a defect
+        return json.loads(fenced.group(1) if fenced else text), False
+    except json.JSONDecodeError:
+        pass
+    repaired = repair_json(text)
+    try:
+        return json.loads(repaired), True
+    except json.JSONDecodeError:
+        pass
+    try:
+        # Single-quoted, Python-style dicts
+        to_python = {v: k for k, v in PY_LITERALS.items()}
+        return ast.literal_eval(JSON_LITERALS.sub(lambda m: to_python[m.group(1)], repaired)), True
+    except (ValueError, SyntaxError) as e:
+        raise OutputParserException(f"Unparseable model output: {e}", llm_output=str(text)[:500])
+
+
+def _content(message) -> str:
+    return message.content if hasattr(message, "content") else str(message)
+
+
+def json_parser(usage: Optional[Dict] = None) -> Runnable:
+    """JsonOutputParser stand-in that repairs before failing; counts into `usage`."""
+    usage = usage if usage is not None else new_usage()
+
+    def parse(message):
+        usage["calls"] += 1
+        try:
+            value, repaired = parse_json(_content(message))
+        except OutputParserException:
+            usage["wasted"] += 1
+            raise
+        usage["repaired"] += repaired
+        return value
+
+    return RunnableLambda(parse)
+
+
+class StructuredLLM(Runnable):
+    """
+    Runnable returning `schema` instances as dicts. `llm` is a RoutedLLM; it
+    requests provider-side structured output from backends that support it.
+    Responses that still fail validation after repair are retried up to
+    `retries` times.
+    """
+
+    def __init__(self, llm, schema: Type[BaseModel], retries: int = 1, usage: Optional[Dict] = None):
+        self.llm = llm
+        self.schema = schema
+        self.retries = retries
+        self.usage = usage if usage is not None else new_usage()
+
+    def _parse(self, res) -> BaseModel:
+        if isinstance(res, dict) and "raw" in res:
+            if res.get("parsed") is not None:
+                return res["parsed"]
+            res = res["raw"]
+        value, repaired = parse_json(_content(res))
+        parsed = self.schema.model_validate(value)
+        self.usage["repaired"] += repaired
+        return parsed
+
+    def invoke(self, input: Any, config=None, **kwargs) -> Dict:
+        last_error = None
+        for attempt in range(self.retries + 1):
+            self.usage["calls"] += 1
+            res = self.llm.invoke_structured(input, self.schema, config, **kwargs)
+            try:
+                return self._parse(res).model_dump()
+            except (OutputParserException, ValidationError) as e:
+                self.usage["wasted"] += 1
+                last_error = e
+                print(f"Invalid {self.schema.__name__} output (attempt {attempt + 1}): {str(e).splitlines()[0]}")
+        raise last_error
@@ -0,0 +1,85 @@
+import os
+import json
+import urllib.request
+
+import pytest
+
+from src import feed, mock_feed
+
+
+@pytest.fixture
+def server():
+    srv = mock_feed.start(0, rows=20000)
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def _url(srv):
+    return f"http://127.0.0.1:{srv.server_port}/supplier_catalog.csv"
+
+
+def _bump(srv):
+    req = urllib.request.Request(f"http://127.0.0.1:{srv.server_port}/bump", method="POST")
+    urllib.request.urlopen(req).close()
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_fetch_not_modified_resume_and_new_version(server, tmp_path):
+    dest = str(tmp_path / "supplier_catalog.csv")
+
+    first = feed.fetch_feed(_url(server), dest)
+    assert first["changed"] and first["status"] == 200 and not first["resumed"]
+    assert first["bytes"] == len(server.body)
+    assert _read(dest) == server.body
+    mtime = os.stat(dest).st_mtime_ns
+
+    unchanged = feed.fetch_feed(_url(server), dest)
+    assert unchanged == {**unchanged, "changed": False, "status": 304, "bytes": 0}
+    assert os.stat(dest).st_mtime_ns == mtime
+    assert server.requests[-1]["If-None-Match"] == server.etag
+
+    # New version whose first download is cut halfway: the retry resumes
+    _bump(server)
+    server.drop_after = len(server.body) // 2
+    resumed = feed.fetch_feed(_url(server), dest)
+    assert resumed["changed"] and resumed["resumed"] and resumed["status"] == 206
+    assert resumed["bytes"] == len(server.body)
+    assert server.requests[-1]["Range"] == f"bytes={len(server.body) // 2}-"
+    assert _read(dest) == server.body
+    assert not os.path.exists(dest + ".part")
+
+    _bump(server)
+    bumped = feed.fetch_feed(_url(server), dest)
+    assert bumped["changed"] and bumped["status"] == 200 and not bumped["resumed"]
+    assert _read(dest) == server.body
+    with open(dest + ".feed.json") as f:
+        assert json.load(f)["etag"] == server.etag
+
+
+def test_stale_partial_download_restarts(server, tmp_path):
+    dest = str(tmp_path / "supplier_catalog.csv")
+    with open(dest + ".part", "wb") as f:
+        f.write(b"x" * (len(server.body) + 10))
+    with open(dest + ".part.json", "w") as f:
+        json.dump({"url": _url(server), "etag": server.etag}, f)
+
+    result = feed.fetch_feed(_url(server), dest)
+    assert result["status"] == 200
+    assert _read(dest) == server.body
+
+
+def test_raises_when_attempts_run_out(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(feed, "FETCH_ATTEMPTS", 1)
+    dest = str(tmp_path / "supplier_catalog.csv")
+    with open(dest + ".part", "wb") as f:
+        f.write(b"x" * (len(server.body) + 10))
+    with open(dest + ".part.json", "w") as f:
+        json.dump({"url": _url(server), "etag": server.etag}, f)
+
+    with pytest.raises(RuntimeError):
+        feed.fetch_feed(_url(server), dest)
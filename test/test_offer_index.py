@@ -0,0 +1,71 @@
+import pandas as pd
+import pytest
+
+from src.catalog import OfferIndex, CATALOG_SCHEMA
+
+
+@pytest.fixture
+def catalog():
+    # P1-A ships light (cheapest to AU and in the worst case), P1-C is cheaper
+    # to buy but heavier, which only pays off for US orders:
+    #   landed US: A 14.5, C 14.0   AU: A 16.0, C 16.5   worst case: A 16.0, C 16.5
+    df = pd.DataFrame([
+        {"supplier_sku": "P1-A", "product_id": "P1", "supplier": "SupA", "cost_price": 10.0,
+         "weight_kg": 0.4, "stock": 5, "supplier_lead_days": 5},
+        {"supplier_sku": "P1-C", "product_id": "P1", "supplier": "SupC", "cost_price": 5.5,
+         "weight_kg": 1.5, "stock": 2, "supplier_lead_days": 7},
+        {"supplier_sku": "P2-A", "product_id": "P2", "supplier": None, "cost_price": 3.0,
+         "weight_kg": 0.4, "stock": 1, "supplier_lead_days": 2},
+    ])
+    return df.astype({k: v for k, v in CATALOG_SCHEMA.items() if k in df})
+
+
+def _skus(result):
+    return [(a["supplier_sku"], a["quantity"]) for a in result["allocations"]]
+
+
+def test_single_offer_by_sku_or_product(catalog):
+    offers = OfferIndex(catalog)
+    result = offers.allocate("P1-A", 1, "AU")
+    assert result["outcome"] == "SINGLE" and not result["rerouted"]
+    assert result["allocations"] == [{"supplier_sku": "P1-A", "supplier": "SupA", "quantity": 1, "landed_cost": 16.0}]
+
+    result = offers.allocate("P2", 1)
+    assert _skus(result) == [("P2-A", 1)] and result["allocations"][0]["supplier"] is None
+
+
+def test_ranking_per_destination_country(catalog):
+    offers = OfferIndex(catalog)
+    us = offers.allocate("P1", 1, "US")
+    assert us["allocations"][0]["supplier_sku"] == "P1-C" and us["allocations"][0]["landed_cost"] == 14.0
+    # Unknown destination: worst-case landed cost
+    unknown = offers.allocate("P1", 1, "ZZ")
+    assert unknown["allocations"][0]["supplier_sku"] == "P1-A" and unknown["allocations"][0]["landed_cost"] == 16.0
+
+
+def test_reroute_when_best_offer_is_short(catalog):
+    offers = OfferIndex(catalog)
+    result = offers.allocate("P1", 3, "US")
+    assert result["outcome"] == "SINGLE" and result["rerouted"]
+    assert _skus(result) == [("P1-A", 3)]
+
+
+def test_split_across_offers_in_cost_order(catalog):
+    offers = OfferIndex(catalog)
+    result = offers.allocate("P1", 7, "US")
+    assert result["outcome"] == "SPLIT"
+    assert _skus(result) == [("P1-C", 2), ("P1-A", 5)]
+    # Stock is drawn down for every destination's ranking
+    assert offers.allocate("P1", 1, "AU")["outcome"] == "SHORT"
+
+
+def test_short_and_not_found(catalog):
+    offers = OfferIndex(catalog)
+    assert offers.allocate("P1", 8, "US") == {"outcome": "SHORT", "allocations": [], "lead_days": 5}
+    assert offers.allocate("NOPE", 1, "US") == {"outcome": "NOT_FOUND", "allocations": []}
+
+
+def test_only_ordered_products_are_indexed(catalog):
+    offers = OfferIndex(catalog, skus=["P2-A"])
+    assert offers.allocate("P1-A", 1, "US")["outcome"] == "NOT_FOUND"
+    assert offers.allocate("P2-A", 1, "US")["outcome"] == "SINGLE"
@@ -0,0 +1,101 @@
+import pandas as pd
+import pytest
+
+from src import order_store
+
+HEADER = "order_id,sku,quantity,customer_country,order_date\n"
+
+
+def _row(order_id, sku="SKU-1001", quantity=1):
+    return f"{order_id},{sku},{quantity},US,2023-10-27\n"
+
+
+@pytest.fixture
+def store(tmp_path):
+    conn = order_store.connect(str(tmp_path / "orders.sqlite"))
+    yield conn
+    conn.close()
+
+
+def _write(path, text, mode="w"):
+    with open(path, mode) as f:
+        f.write(text)
+
+
+def _route(store, path, action="FULFILL_DROPSHIP", actions=None):
+    """pending_orders + mark_processed, as one routing run does."""
+    orders, watermark = order_store.pending_orders(store, path)
+    done = [{"order_id": o, "sku": s, "action": (actions or {}).get(o, action)}
+            for o, s in zip(orders['order_id'], orders['sku'])]
+    order_store.mark_processed(store, done, "run", watermark, orders)
+    return orders
+
+
+def test_second_run_skips_processed_orders(store, tmp_path):
+    path = str(tmp_path / "orders.csv")
+    _write(path, HEADER + _row("A") + _row("B"))
+    assert _route(store, path)['order_id'].tolist() == ["A", "B"]
+    assert len(_route(store, path)) == 0
+
+
+def test_appended_orders_read_from_watermark(store, tmp_path):
+    path = str(tmp_path / "orders.csv")
+    _write(path, HEADER + _row("A"))
+    _route(store, path)
+    _write(path, _row("B"), mode="a")
+
+    orders, watermark = order_store.pending_orders(store, path)
+    assert orders['order_id'].tolist() == ["B"]
+    assert watermark["offset"] == len(HEADER + _row("A") + _row("B"))
+
+
+def test_partial_trailing_line_waits_for_next_run(store, tmp_path):
+    path = str(tmp_path / "orders.csv")
+    _write(path, HEADER + _row("A") + "B,SKU-10")
+    assert _route(store, path)['order_id'].tolist() == ["A"]
+
+    _write(path, "01,1,US,2023-10-27\n", mode="a")
+    orders = _route(store, path)
+    assert orders['order_id'].tolist() == ["B"]
+    assert orders['sku'].tolist() == ["SKU-1001"]
+
+
+def test_truncated_or_replaced_file_is_read_from_the_top(store, tmp_path):
+    path = str(tmp_path / "orders.csv")
+    _write(path, HEADER + _row("A") + _row("B"))
+    _route(store, path)
+
+    # Shorter than the watermark: read again, already processed ids skipped
+    _write(path, HEADER + _row("C"))
+    assert _route(store, path)['order_id'].tolist() == ["C"]
+
+    # Same length, different start
+    _write(path, HEADER + _row("D"))
+    assert _route(store, path)['order_id'].tolist() == ["D"]
+
+
+def test_backorders_are_routed_again(store, tmp_path):
+    path = str(tmp_path / "orders.csv")
+    _write(path, HEADER + _row("A", quantity=999) + _row("B"))
+    _route(store, path, actions={"A": "BACKORDER"})
+
+    orders = _route(store, path, actions={"A": "BACKORDER"})
+    assert orders['order_id'].tolist() == ["A"]
+    assert orders['quantity'].tolist() == [999]
+    assert orders['previous_action'].tolist() == ["BACKORDER"]
+
+    # Fulfilled now, so it drops out
+    _route(store, path)
+    assert len(_route(store, path)) == 0
+
+
+def test_backorder_and_new_order_are_both_pending(store, tmp_path):
+    path = str(tmp_path / "orders.csv")
+    _write(path, HEADER + _row("A", quantity=999))
+    _route(store, path, action="BACKORDER")
+    _write(path, _row("B"), mode="a")
+
+    orders, _ = order_store.pending_orders(store, path)
+    assert orders['order_id'].tolist() == ["A", "B"]
+    assert orders['previous_action'].tolist()[0] == "BACKORDER"
+    assert pd.isna(orders['previous_action'].tolist()[1])